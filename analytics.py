@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict
+
+import numpy as np
+
+from db import DBManager
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "32"))
+# Границы корзин глобальной редкости, % игроков с достижением
+RARITY_BINS = np.array([0, 1, 5, 10, 25, 50, 100.01])
+RARITY_LABELS = ["<1%", "1-5%", "5-10%", "10-25%", "25-50%", "50%+"]
+# Границы корзин прохождения игр, %
+COMPLETION_BINS = np.array([0, 0.01, 25, 50, 75, 100])
+COMPLETION_LABELS = ["0%", "1-24%", "25-49%", "50-74%", "75-99%", "100%"]
+# Нижняя граница редкости для веса очков, чтобы 0% не давал бесконечность
+MIN_RARITY = 0.1
+NEAREST_COMPLETIONS = 5
+
+
+def achievement_weights(rarity: np.ndarray) -> np.ndarray:
+    """Points per achievement: 1 for one everybody has, +1 for every halving of the share of owners"""
+    return 1 + np.log2(100 / np.clip(rarity, MIN_RARITY, 100))
+
+
+class ProfileAnalytics:
+    """Vectorised rarity/completion analytics over one profile's achievements.
+
+    Results are cached per profile together with the profile_stats timestamp
+    they were computed for, so they are recomputed only after an import or
+    sync changed the profile.
+    """
+
+    def __init__(self, db: DBManager, cache_size: int = ANALYTICS_CACHE_SIZE):
+        self.db = db
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, steam_id: str, marker=None) -> Optional[Dict]:
+        """Analytics for a profile; marker is profile_stats.updated_at (any value that changes with the data)"""
+        steam_id = str(steam_id)
+        with self.lock:
+            cached = self.cache.get(steam_id)
+            if cached is not None and cached[0] == marker:
+                self.cache.move_to_end(steam_id)
+                return cached[1]
+
+        result = self.compute(steam_id)
+        if result is not None:
+            with self.lock:
+                self.cache[steam_id] = (marker, result)
+                self.cache.move_to_end(steam_id)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return result
+
+    def load(self, steam_id: str):
+        achievements = self.db.execute_query(
+            """SELECT a.rarity, pa.completeness
+               FROM profile_achievements pa
+               JOIN achievements a ON a.id = pa.achievement_id
+               WHERE pa.profile_id = %s AND a.rarity IS NOT NULL""",
+            (int(steam_id),)
+        )
+        games = self.db.execute_query(
+            """SELECT g.name, pg.playtime,
+                      COALESCE(s.total_achievements, 0) AS total_achievements,
+                      COALESCE(s.unlocked_achievements, 0) AS unlocked_achievements
+               FROM profile_games pg
+               JOIN games g ON g.app_id = pg.game_id
+               LEFT JOIN profile_game_stats s ON s.profile_id = pg.profile_id AND s.game_id = pg.game_id
+               WHERE pg.profile_id = %s""",
+            (int(steam_id),)
+        )
+        return achievements, games
+
+    def compute(self, steam_id: str) -> Optional[Dict]:
+        achievements, games = self.load(steam_id)
+        if achievements is None or games is None:
+            return None
+
+        count = len(achievements)
+        rarity = np.fromiter((row['rarity'] for row in achievements), dtype=np.float64, count=count)
+        unlocked = np.fromiter((row['completeness'] == 1 for row in achievements), dtype=bool, count=count)
+
+        # Гистограммы редкости: все достижения профиля и полученные
+        rarity_all, _ = np.histogram(rarity, bins=RARITY_BINS)
+        rarity_unlocked, _ = np.histogram(rarity[unlocked], bins=RARITY_BINS)
+
+        weights = achievement_weights(rarity)
+        score = float(weights[unlocked].sum())
+        max_score = float(weights.sum())
+
+        names = [row['name'] for row in games]
+        playtime = np.fromiter((row['playtime'] or 0 for row in games), dtype=np.float64, count=len(games)) / 60
+        total = np.fromiter((row['total_achievements'] for row in games), dtype=np.float64, count=len(games))
+        done = np.fromiter((row['unlocked_achievements'] for row in games), dtype=np.float64, count=len(games))
+
+        with_achievements = total > 0
+        completion = np.divide(done, total, out=np.zeros_like(total), where=with_achievements) * 100
+        completion_counts = np.bincount(
+            np.digitize(completion[with_achievements], COMPLETION_BINS[1:], right=False),
+            minlength=len(COMPLETION_LABELS)
+        )[:len(COMPLETION_LABELS)]
+
+        # Оценка времени до 100%: темп получения достижений в игре переносится на оставшиеся
+        in_progress = with_achievements & (done > 0) & (done < total) & (playtime > 0)
+        rate = np.divide(done, playtime, out=np.zeros_like(done), where=in_progress)
+        eta = np.divide(total - done, rate, out=np.full_like(done, np.inf), where=in_progress & (rate > 0))
+        finite = np.isfinite(eta)
+        nearest = np.argsort(eta)[:NEAREST_COMPLETIONS]
+
+        return {
+            "achievements": count,
+            "unlocked": int(unlocked.sum()),
+            "rarity_labels": RARITY_LABELS,
+            "rarity_all": rarity_all.tolist(),
+            "rarity_unlocked": rarity_unlocked.tolist(),
+            "score": round(score),
+            "score_percent": score / max_score * 100 if max_score else 0.0,
+            "median_unlocked_rarity": float(np.median(rarity[unlocked])) if unlocked.any() else None,
+            "completion_labels": COMPLETION_LABELS,
+            "completion_counts": completion_counts.tolist(),
+            "games_in_progress": int(in_progress.sum()),
+            "hours_to_complete": float(eta[finite].sum()),
+            "median_hours_to_complete": float(np.median(eta[finite])) if finite.any() else None,
+            "nearest_completions": [
+                {"name": names[i], "completion": float(completion[i]), "hours": float(eta[i])}
+                for i in nearest if finite[i]
+            ],
+        }
+
@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict
+
+from steam_api import SteamAPIManager
+
+AVATAR_CACHE_DIR = os.getenv("AVATAR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "cache", "avatars"))
+AVATAR_CACHE_SIZE = int(os.getenv("AVATAR_CACHE_SIZE", "256"))
+# Как долго аватар считается свежим без запроса на перепроверку
+AVATAR_MAX_AGE_HOURS = float(os.getenv("AVATAR_MAX_AGE_HOURS", "24"))
+# Иконки достижений кэшируются тем же классом; их URL содержат хэш содержимого и не меняются
+ICON_CACHE_DIR = os.getenv("ICON_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "cache", "icons"))
+ICON_CACHE_SIZE = int(os.getenv("ICON_CACHE_SIZE", "1024"))
+ICON_MAX_AGE_HOURS = float(os.getenv("ICON_MAX_AGE_HOURS", "720"))
+
+
+class AvatarCache:
+    """Base64 avatar thumbnails cached in memory (LRU) and on disk by URL hash.
+
+    Entries younger than max_age are served without any network access; older
+    ones are revalidated with ETag / Last-Modified before being re-downloaded.
+    """
+
+    def __init__(self, api: SteamAPIManager, directory: str = AVATAR_CACHE_DIR,
+                 max_entries: int = AVATAR_CACHE_SIZE, max_age_hours: float = AVATAR_MAX_AGE_HOURS):
+        self.api = api
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age_hours * 3600
+        self.memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + ".png", base + ".json"
+
+    def remember(self, url: str, entry: Dict):
+        with self.lock:
+            self.memory[url] = entry
+            self.memory.move_to_end(url)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def load_from_disk(self, url: str) -> Optional[Dict]:
+        image_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(image_path, "rb") as f:
+                entry["payload"] = base64.b64encode(f.read()).decode()
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def save_to_disk(self, url: str, entry: Dict, image: Optional[bytes]):
+        image_path, meta_path = self.paths(url)
+        meta = {key: value for key, value in entry.items() if key != "payload"}
+        try:
+            if image is not None:
+                with open(image_path + ".tmp", "wb") as f:
+                    f.write(image)
+                os.replace(image_path + ".tmp", image_path)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            print(f"Error writing avatar cache: {e}")
+
+    def get(self, url: str) -> Optional[str]:
+        """Return the base64 PNG thumbnail for an avatar URL"""
+        if not url:
+            return None
+
+        with self.lock:
+            entry = self.memory.get(url)
+            if entry is not None:
+                self.memory.move_to_end(url)
+        if entry is None:
+            entry = self.load_from_disk(url)
+
+        if entry is not None and time.time() - entry["checked_at"] < self.max_age:
+            self.remember(url, entry)
+            return entry["payload"]
+
+        # Запись устарела или отсутствует - перепроверяем на сервере
+        result = self.api.fetch_avatar(
+            url,
+            etag=entry.get("etag") if entry else None,
+            last_modified=entry.get("last_modified") if entry else None
+        )
+        if result is None:
+            # Сеть недоступна - лучше показать старый аватар, чем ничего
+            return entry["payload"] if entry else None
+
+        image, validators = result
+        if image is None and entry is None:
+            return None
+        new_entry = {
+            "checked_at": time.time(),
+            "etag": validators.get("etag") or (entry or {}).get("etag"),
+            "last_modified": validators.get("last_modified") or (entry or {}).get("last_modified"),
+            "payload": base64.b64encode(image).decode() if image is not None else entry["payload"],
+        }
+        self.save_to_disk(url, new_entry, image)
+        self.remember(url, new_entry)
+        return new_entry["payload"]
@@ -0,0 +1,217 @@
+"""Local stand-in for the Steam Web API serving synthetic, deterministic libraries.
+
+    python benchmarks/fake_steam.py [--port 8765] [--games 500] [--achievements 40]
+                                    [--latency-ms 20] [--throttle-rate 0.01]
+
+Point the app at it with STEAM_API_BASE_URL=http://127.0.0.1:8765.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+# Каталог игр общий для всех профилей; app_id начинаются с этого значения
+FIRST_APP_ID = 100000
+# Steam ID синтетических профилей
+FIRST_STEAM_ID = 76561190000000000
+
+
+class SyntheticCatalog:
+    """Deterministic games, achievements and libraries derived from a seed"""
+
+    def __init__(self, games_per_profile: int = 500, achievements_per_game: int = 40,
+                 catalog_size: Optional[int] = None, unlock_rate: float = 0.5, seed: int = 1):
+        self.games_per_profile = games_per_profile
+        self.achievements_per_game = achievements_per_game
+        self.catalog_size = max(catalog_size or games_per_profile * 4, games_per_profile)
+        self.unlock_rate = unlock_rate
+        self.seed = seed
+
+    def app_ids(self) -> List[int]:
+        return list(range(FIRST_APP_ID, FIRST_APP_ID + self.catalog_size))
+
+    def game_name(self, app_id: int) -> str:
+        return f"Synthetic Game {app_id - FIRST_APP_ID:06d}"
+
+    def achievement_names(self, app_id: int) -> List[str]:
+        # Каждая пятая игра без достижений, как и в реальных библиотеках
+        if app_id % 5 == 0:
+            return []
+        return [f"ACH_{app_id}_{i:03d}" for i in range(self.achievements_per_game)]
+
+    def global_percentages(self, app_id: int) -> Dict[str, float]:
+        rng = random.Random(f"{self.seed}:rarity:{app_id}")
+        return {name: round(rng.betavariate(0.7, 1.5) * 100, 2) for name in self.achievement_names(app_id)}
+
+    def library(self, steam_id: str) -> List[Dict]:
+        rng = random.Random(f"{self.seed}:library:{steam_id}")
+        app_ids = rng.sample(self.app_ids(), self.games_per_profile)
+        return [
+            {
+                "appid": app_id,
+                "name": self.game_name(app_id),
+                "img_icon_url": f"{app_id:040x}",
+                "playtime_forever": rng.randint(0, 20000),
+                "rtime_last_played": rng.randint(1_500_000_000, 1_700_000_000),
+                "has_community_visible_stats": 1 if self.achievement_names(app_id) else 0,
+            }
+            for app_id in app_ids
+        ]
+
+    def player_achievements(self, steam_id: str, app_id: int) -> List[Dict]:
+        rng = random.Random(f"{self.seed}:unlocks:{steam_id}:{app_id}")
+        return [
+            {"apiname": name, "achieved": int(rng.random() < self.unlock_rate), "unlocktime": 0}
+            for name in self.achievement_names(app_id)
+        ]
+
+    def summary(self, steam_id: str) -> Dict:
+        return {
+            "steamid": str(steam_id),
+            "personaname": f"bench-{str(steam_id)[-6:]}",
+            "timecreated": 1_300_000_000,
+            "avatar": "",
+        }
+
+
+class FakeSteamServer:
+    """Threaded HTTP server answering the endpoints used by SteamAPIManager"""
+
+    def __init__(self, catalog: SyntheticCatalog, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 0):
+        self.catalog = catalog
+        self.latency = latency_ms / 1000
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.counters = {"requests": 0, "throttled": 0}
+        self.lock = threading.Lock()
+        self.rng = random.Random(catalog.seed)
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        return Handler
+
+    def route(self, path: str, query: Dict[str, str]) -> Optional[Dict]:
+        steam_id = query.get("steamid", "")
+        if path.startswith("/ISteamUser/GetPlayerSummaries"):
+            ids = [i for i in query.get("steamids", "").split(",") if i]
+            return {"response": {"players": [self.catalog.summary(i) for i in ids]}}
+        if path.startswith("/IPlayerService/GetOwnedGames"):
+            games = self.catalog.library(steam_id)
+            return {"response": {"game_count": len(games), "games": games}}
+        if path.startswith("/ISteamUserStats/GetPlayerAchievements"):
+            achievements = self.catalog.player_achievements(steam_id, int(query.get("appid", 0)))
+            return {"playerstats": {"steamID": steam_id, "achievements": achievements, "success": True}}
+        if path.startswith("/ISteamUserStats/GetSchemaForGame"):
+            app_id = int(query.get("appid", 0))
+            return {"game": {"gameName": self.catalog.game_name(app_id), "availableGameStats": {
+                "achievements": [
+                    {"name": name, "displayName": name.replace("_", " ").title(), "hidden": 0,
+                     "description": f"Synthetic achievement {name}", "icon": "", "icongray": ""}
+                    for name in self.catalog.achievement_names(app_id)
+                ]
+            }}}
+        if path.startswith("/ISteamUserStats/GetGlobalAchievementPercentagesForApp"):
+            percentages = self.catalog.global_percentages(int(query.get("gameid", 0)))
+            return {"achievementpercentages": {
+                "achievements": [{"name": name, "percent": pct} for name, pct in percentages.items()]
+            }}
+        return None
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        with self.lock:
+            self.counters["requests"] += 1
+            throttled = self.rng.random() < self.throttle_rate
+            if throttled:
+                self.counters["throttled"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if throttled:
+            request.send_response(429)
+            request.send_header("Retry-After", str(self.retry_after))
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        parsed = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        payload = self.route(parsed.path, query)
+        if payload is None:
+            request.send_response(404)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        body = json.dumps(payload).encode()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> "FakeSteamServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-steam", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_catalog_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--games", type=int, default=500, help="games per profile")
+    parser.add_argument("--achievements", type=int, default=40, help="achievements per game")
+    parser.add_argument("--catalog", type=int, default=None, help="distinct games (default 4x --games)")
+    parser.add_argument("--unlock-rate", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def catalog_from_args(args) -> SyntheticCatalog:
+    return SyntheticCatalog(args.games, args.achievements, args.catalog, args.unlock_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic Steam Web API responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After sent with 429, seconds")
+    add_catalog_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeSteamServer(catalog_from_args(args), args.host, args.port,
+                             args.latency_ms, args.throttle_rate, args.retry_after)
+    print(f"Fake Steam API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Requests served:", server.counters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Throughput and latency of the import and query paths against the fake Steam API.
+
+    python benchmarks/run.py [--imports 3] [--latency-ms 20] [--throttle-rate 0.01]
+                             [--query-profiles 10] [--iterations 50] [--json]
+
+Imports run ProfileImporter.add_profile (summary + load_games_and_achievements)
+for fresh synthetic profiles; queries use profiles created by seed.py or the
+imports. Uses the DB_* settings from .env - point DB_NAME at a scratch database.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+load_dotenv(os.path.join(ROOT, ".env"))
+
+from db import DB_QUERY_CACHE_SIZE, DBManager
+from fake_steam import FIRST_STEAM_ID, FakeSteamServer, add_catalog_arguments, catalog_from_args
+from importer import ProfileImporter
+from metrics import metrics
+from steam_api import RateLimiter, SteamAPIManager
+
+# Импортируемые профили не пересекаются с профилями из seed.py
+IMPORT_STEAM_ID = FIRST_STEAM_ID + 1_000_000
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict:
+    """Latency percentiles in ms and operations per second"""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "ops": len(ordered),
+        "ops_per_s": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def bench_imports(importer: ProfileImporter, db: DBManager, server: FakeSteamServer, count: int) -> Dict:
+    steam_ids = [str(IMPORT_STEAM_ID + i) for i in range(count)]
+    # Каждый запуск измеряет первый импорт, а не инкрементальный
+    placeholders = ",".join(["%s"] * len(steam_ids))
+    db.execute_update(f"DELETE FROM profiles WHERE steam_id IN ({placeholders})", tuple(steam_ids))
+    db.execute_update(f"DELETE FROM import_checkpoints WHERE profile_id IN ({placeholders})", tuple(steam_ids))
+
+    latencies = []
+    games = achievements = failed = 0
+    requests_before = dict(server.counters)
+    started = time.perf_counter()
+    for steam_id in steam_ids:
+        t0 = time.perf_counter()
+        if not importer.add_profile(steam_id):
+            failed += 1
+        latencies.append(time.perf_counter() - t0)
+        library = server.catalog.library(steam_id)
+        games += len(library)
+        achievements += sum(len(server.catalog.achievement_names(game["appid"])) for game in library)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed)
+    result.update({
+        "failed": failed,
+        "games_per_s": games / elapsed,
+        "achievements_per_s": achievements / elapsed,
+        "api_requests": server.counters["requests"] - requests_before["requests"],
+        "api_throttled": server.counters["throttled"] - requests_before["throttled"],
+    })
+    return result
+
+
+def bench_query(call: Callable[[str], object], steam_ids: List[str], iterations: int) -> Dict:
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        call(steam_ids[i % len(steam_ids)])
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def print_report(results: Dict):
+    for name, result in results.items():
+        print(f"\n{name}")
+        for key, value in result.items():
+            print(f"  {key:>20}: {value:,.2f}" if isinstance(value, float) else f"  {key:>20}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import and query paths")
+    parser.add_argument("--imports", type=int, default=3, help="profiles imported through the fake API")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fake API latency per request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--respect-quota", action="store_true", help="keep the real Steam rate limits")
+    parser.add_argument("--no-fast-load", action="store_true", help="import with per-row upserts only")
+    parser.add_argument("--query-cache", action="store_true", help="keep DBManager's read cache on (measures hits)")
+    parser.add_argument("--query-profiles", type=int, default=10, help="profiles queried round-robin")
+    parser.add_argument("--iterations", type=int, default=50, help="calls per query benchmark")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--metrics", help="collect API/DB metrics and write them to this .prom/.json file")
+    add_catalog_arguments(parser)
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+
+    server = FakeSteamServer(catalog_from_args(args), latency_ms=args.latency_ms,
+                             throttle_rate=args.throttle_rate).start()
+    # Без --respect-quota лимитер не ограничивает скорость и измеряется сам импорт
+    limiter = None if args.respect_quota else RateLimiter(burst_rate=1e9, burst_capacity=10**9,
+                                                          daily_quota=10**12)
+    api = SteamAPIManager("bench", base_url=server.url, limiter=limiter)
+    # Без --query-cache повторные запросы идут в MySQL, а не в кэш процесса
+    db = DBManager(query_cache_size=DB_QUERY_CACHE_SIZE if args.query_cache else 0)
+    importer = ProfileImporter(api, db, fast_load=not args.no_fast_load)
+
+    results = {}
+    try:
+        if args.imports:
+            results["load_games_and_achievements"] = bench_imports(importer, db, server, args.imports)
+
+        steam_ids = [str(steam_id) for steam_id in db.get_profile_steam_ids()[:args.query_profiles]]
+        if steam_ids and args.iterations:
+            results["get_profile_statistics"] = bench_query(db.get_profile_statistics, steam_ids, args.iterations)
+            results["get_profile_games"] = bench_query(db.get_profile_games, steam_ids, args.iterations)
+            results["get_profile_games_page"] = bench_query(
+                lambda steam_id: db.get_profile_games_page(steam_id, sort="completion_percent", descending=True),
+                steam_ids, args.iterations
+            )
+            results["get_playtime_history"] = bench_query(
+                lambda steam_id: db.get_playtime_history(steam_id, "week"), steam_ids, args.iterations
+            )
+            db.refresh_leaderboards(force=True)
+            results["get_leaderboard"] = bench_query(
+                lambda _: db.get_leaderboard("completed_games", 50), steam_ids, args.iterations
+            )
+            results["get_rarest_unlocks"] = bench_query(
+                lambda _: db.get_rarest_unlocks(50), steam_ids, args.iterations
+            )
+    finally:
+        server.stop()
+        db.disconnect()
+        if args.metrics:
+            metrics.dump(args.metrics)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
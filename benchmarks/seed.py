@@ -0,0 +1,153 @@
+"""Seed the structure.sql schema with synthetic profiles for query benchmarks.
+
+    python benchmarks/seed.py --scale 100k [--create-schema] [--games 500] [--achievements 40]
+
+--scale is the approximate number of profile_achievements rows (10k, 100k, 1m
+or a plain number). Uses the DB_* settings from .env; point DB_NAME at a
+scratch database, --create-schema drops and recreates every table.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+load_dotenv(os.path.join(ROOT, ".env"))
+
+from db import DBManager
+from fake_steam import FIRST_STEAM_ID, SyntheticCatalog, add_catalog_arguments, catalog_from_args
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BATCH_ROWS = 5000
+
+
+def parse_scale(value: str) -> int:
+    return SCALES.get(value.lower()) or int(value)
+
+
+def batches(rows: List, size: int = BATCH_ROWS):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def create_schema(db: DBManager):
+    """Run structure.sql against the configured database instead of the hard-coded one"""
+    with open(os.path.join(ROOT, "structure.sql"), encoding="utf-8") as f:
+        script = f.read()
+    # Дамп создаёт базу acch; таблицы создаём в базе из DB_NAME
+    script = "\n".join(line for line in script.splitlines()
+                       if not line.startswith(("CREATE DATABASE", "USE ")))
+    with db.checkout() as connection, connection.cursor() as cursor:
+        cursor.execute(script)
+        while cursor.nextset():
+            pass
+
+
+def seed_catalog(db: DBManager, catalog: SyntheticCatalog) -> Dict[tuple, int]:
+    """Insert games and achievements; returns achievement ids keyed by (app_id, name)"""
+    now = datetime.now()
+    games = [(app_id, catalog.game_name(app_id)) for app_id in catalog.app_ids()]
+    achievements = []
+    rarity_rows = []
+    for app_id in catalog.app_ids():
+        percentages = catalog.global_percentages(app_id)
+        if percentages:
+            rarity_rows.append((app_id, now))
+        achievements.extend((app_id, name, pct) for name, pct in percentages.items())
+
+    with db.transaction() as cursor:
+        for batch in batches(games):
+            cursor.executemany("INSERT IGNORE INTO games (app_id, name) VALUES (%s, %s)", batch)
+        for batch in batches(achievements):
+            cursor.executemany(
+                """INSERT INTO achievements (game_id, achievement_name, rarity)
+                   VALUES (%s, %s, %s)
+                   ON DUPLICATE KEY UPDATE rarity = VALUES(rarity)""",
+                batch
+            )
+        for batch in batches(rarity_rows):
+            cursor.executemany(
+                """INSERT INTO rarity_cache (app_id, refreshed_at) VALUES (%s, %s)
+                   ON DUPLICATE KEY UPDATE refreshed_at = VALUES(refreshed_at)""",
+                batch
+            )
+        # id назначает AUTO_INCREMENT, в непустой базе они не начинаются с 1
+        cursor.execute("SELECT id, game_id, achievement_name FROM achievements")
+        return {(row['game_id'], row['achievement_name']): row['id'] for row in cursor.fetchall()}
+
+
+def seed_profile(db: DBManager, catalog: SyntheticCatalog, ids: Dict[tuple, int], steam_id: int) -> int:
+    summary = catalog.summary(str(steam_id))
+    library = catalog.library(str(steam_id))
+    profile_games = [
+        (steam_id, game["appid"], game["playtime_forever"], game["rtime_last_played"])
+        for game in library
+    ]
+    profile_achievements = [
+        (steam_id, ids[(game["appid"], ach["apiname"])], ach["achieved"])
+        for game in library
+        for ach in catalog.player_achievements(str(steam_id), game["appid"])
+    ]
+
+    with db.transaction() as cursor:
+        cursor.execute(db.PROFILE_UPSERT_QUERY, (steam_id, summary["personaname"],
+                                                datetime.fromtimestamp(summary["timecreated"]), ""))
+        for batch in batches(profile_games):
+            cursor.executemany(
+                """INSERT INTO profile_games (profile_id, game_id, playtime, rtime_last_played)
+                   VALUES (%s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE playtime = VALUES(playtime),
+                                           rtime_last_played = VALUES(rtime_last_played)""",
+                batch
+            )
+        for batch in batches(profile_achievements):
+            cursor.executemany(
+                """INSERT INTO profile_achievements (profile_id, achievement_id, completeness)
+                   VALUES (%s, %s, %s)
+                   ON DUPLICATE KEY UPDATE completeness = VALUES(completeness)""",
+                batch
+            )
+    # Агрегаты считаются тем же кодом, что и при обычном импорте
+    db.refresh_profile_game_stats(str(steam_id))
+    db.refresh_profile_stats(str(steam_id))
+    return len(profile_games) + len(profile_achievements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic profiles")
+    parser.add_argument("--scale", default="10k", help="approximate profile_achievements rows: 10k, 100k, 1m or N")
+    parser.add_argument("--profiles", type=int, default=None, help="override the profile count derived from --scale")
+    parser.add_argument("--create-schema", action="store_true", help="drop and recreate all tables first")
+    add_catalog_arguments(parser)
+    args = parser.parse_args()
+
+    catalog = catalog_from_args(args)
+    with_achievements = sum(1 for app_id in catalog.app_ids() if catalog.achievement_names(app_id))
+    rows_per_profile = catalog.games_per_profile * catalog.achievements_per_game * with_achievements / catalog.catalog_size
+    profiles = args.profiles or max(1, math.ceil(parse_scale(args.scale) / max(1.0, rows_per_profile)))
+
+    db = DBManager()
+    if args.create_schema:
+        create_schema(db)
+
+    started = time.perf_counter()
+    ids = seed_catalog(db, catalog)
+    print(f"Catalog: {catalog.catalog_size} games, {len(ids)} achievements "
+          f"({time.perf_counter() - started:.1f}s)")
+
+    rows = 0
+    for i in range(profiles):
+        rows += seed_profile(db, catalog, ids, FIRST_STEAM_ID + i)
+        elapsed = time.perf_counter() - started
+        print(f"Profile {i + 1}/{profiles}: {rows} rows, {rows / elapsed:,.0f} rows/s")
+    db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
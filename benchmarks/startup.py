@@ -0,0 +1,98 @@
+"""Startup time of the desktop app, measured in fresh interpreters.
+
+    python benchmarks/startup.py [--runs N] [--max-window-ms MS]
+
+Reports how long `import tflet` takes and how long it takes until the window
+is built (SteamStatsApp constructed on a headless page, backend not started),
+plus the cost of the deferred backend imports. Exits with status 1 when the
+median time to window exceeds --max-window-ms, so regressions are caught.
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class HeadlessPage:
+    """Just enough of ft.Page for SteamStatsApp to build its controls"""
+
+    def __init__(self):
+        self.window = type("Window", (), {})()
+        self.overlay = []
+        self.controls = []
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+
+    def update(self, *controls):
+        pass
+
+
+def measure_once() -> dict:
+    """Runs inside the child interpreter"""
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import tflet
+    imported = time.perf_counter()
+
+    class WindowOnlyApp(tflet.SteamStatsApp):
+        def start_backend(self):
+            pass  # Без БД: измеряем только время до показа окна
+
+    app = WindowOnlyApp(HeadlessPage())
+    window = time.perf_counter()
+    app.jobs.shutdown()
+
+    pil_loaded = "PIL" in sys.modules
+
+    for module in ("steam_api", "db", "importer", "avatar_cache"):
+        importlib.import_module(module)
+    backend = time.perf_counter()
+
+    return {
+        "import_ms": (imported - started) * 1000,
+        "window_ms": (window - started) * 1000,
+        "backend_import_ms": (backend - window) * 1000,
+        "pil_loaded": pil_loaded or "PIL" in sys.modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure desktop app startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-window-ms", type=float, default=1500,
+                        help="fail if the median time to window is above this")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_once()))
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                                check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key in ("import_ms", "window_ms", "backend_import_ms"):
+        values = [run[key] for run in runs]
+        print(f"{key:>18}: median {statistics.median(values):8.1f}  min {min(values):8.1f}  "
+              f"max {max(values):8.1f}")
+    if any(run["pil_loaded"] for run in runs):
+        print("warning: PIL was imported during startup")
+
+    median_window = statistics.median(run["window_ms"] for run in runs)
+    if median_window > args.max_window_ms:
+        print(f"FAIL: time to window {median_window:.1f} ms > {args.max_window_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,939 @@
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Dict, List, Set, Tuple
+
+import pymysql
+from pymysql.constants import CLIENT
+
+from metrics import SIZE_BUCKETS, metrics
+
+# Параметры подключения берутся из окружения (.env)
+DB_SETTINGS = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_NAME", "acch"),
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Сколько ждать свободное соединение, прежде чем сообщить об ошибке
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "256"))
+# Ограничивает устаревание, если базу меняет другой процесс (например, sync_daemon)
+DB_QUERY_CACHE_TTL = float(os.getenv("DB_QUERY_CACHE_TTL", "300"))
+
+# Верхняя граница размера одного многострочного INSERT (дополнительно к max_allowed_packet)
+DB_BULK_MAX_BYTES = int(os.getenv("DB_BULK_MAX_BYTES", str(16 * 1024 * 1024)))
+# Сырые приращения времени в игре хранятся помесячными разделами; агрегаты по дням и неделям - бессрочно
+PLAYTIME_DELTA_RETENTION_DAYS = int(os.getenv("PLAYTIME_DELTA_RETENTION_DAYS", "180"))
+PLAYTIME_PARTITIONS_AHEAD = int(os.getenv("PLAYTIME_PARTITIONS_AHEAD", "2"))
+
+READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)", re.IGNORECASE)
+WRITE_TABLES = re.compile(r"\b(?:INTO|UPDATE|FROM|JOIN)\s+`?(\w+)", re.IGNORECASE)
+# ON DELETE/UPDATE CASCADE из structure.sql: запись в родителя меняет и эти таблицы
+CASCADES = {
+    "profiles": ("profile_games", "profile_achievements", "profile_stats", "profile_sync_state",
+                 "import_checkpoints", "leaderboard_ranks", "playtime_buckets"),
+    "games": ("achievements", "profile_games", "rarity_cache"),
+    "achievements": ("profile_achievements",),
+    "profile_games": ("profile_game_stats",),
+}
+
+
+def statement_kind(query: str) -> str:
+    """Leading SQL keyword, used as a metrics label"""
+    match = re.match(r"\s*(\w+)", query)
+    return match.group(1).upper() if match else "OTHER"
+
+
+def month_start(day: date, months: int = 0) -> date:
+    """First day of the month `months` after the one containing day"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def record_batch(query: str, rows: int):
+    """Track how many rows each multi-row write carries, per target table"""
+    match = re.search(r"\b(?:INTO|UPDATE|FROM)\s+`?(\w+)", query, re.IGNORECASE)
+    metrics.observe("db_batch_rows", rows, SIZE_BUCKETS, table=match.group(1) if match else "unknown")
+
+
+class ConnectionPool:
+    """Bounded pool of pymysql connections with a health check on checkout"""
+
+    def __init__(self, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT, **connect_kwargs):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+        self.idle: "queue.LifoQueue[pymysql.connections.Connection]" = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def create(self) -> pymysql.connections.Connection:
+        return pymysql.connect(
+            client_flag=CLIENT.MULTI_STATEMENTS,
+            cursorclass=pymysql.cursors.DictCursor,
+            autocommit=True,
+            **self.connect_kwargs
+        )
+
+    def acquire(self) -> pymysql.connections.Connection:
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_create = self.created < self.size
+                if can_create:
+                    self.created += 1
+            if can_create:
+                try:
+                    return self.create()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            try:
+                connection = self.idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise pymysql.OperationalError(f"No free database connection after {self.timeout}s")
+
+        # Проверяем соединение перед выдачей; ping сам переподключается при обрыве
+        try:
+            connection.ping(reconnect=True)
+            return connection
+        except pymysql.Error:
+            self.discard(connection)
+            return self.acquire()
+
+    def release(self, connection: pymysql.connections.Connection):
+        if self.closed or not connection.open:
+            self.discard(connection)
+        else:
+            self.idle.put(connection)
+
+    def discard(self, connection: pymysql.connections.Connection):
+        with self.lock:
+            self.created -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        self.closed = True
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def cascaded_tables(tables: Iterable[str]) -> Set[str]:
+    """Tables plus every table their foreign keys cascade into"""
+    pending = [table.lower() for table in tables]
+    result = set()
+    while pending:
+        table = pending.pop()
+        if table not in result:
+            result.add(table)
+            pending.extend(CASCADES.get(table, ()))
+    return result
+
+
+class QueryCache:
+    """LRU cache of SELECT results, invalidated by the tables and profile a write touches.
+
+    Entries scoped to a steam_id are dropped only by writes to that profile (or
+    by writes with no profile); unscoped entries by any write to their tables.
+    """
+
+    def __init__(self, max_entries: int = DB_QUERY_CACHE_SIZE, ttl: float = DB_QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple, Tuple[List[Dict], Set[str], Optional[int], float]]" = OrderedDict()
+        self.by_table: Dict[str, Set[Tuple]] = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[3] > self.ttl:
+                self.drop(key)
+                return None
+            self.entries.move_to_end(key)
+        # Копии строк, чтобы вызывающий код не менял закэшированные данные
+        return [dict(row) for row in entry[0]]
+
+    def put(self, key: Tuple, rows: List[Dict], tables: Set[str], steam_id: Optional[int], generation: int):
+        with self.lock:
+            # Пока шёл запрос, запись могла изменить данные - такой результат не сохраняем
+            if generation != self.generation or self.max_entries <= 0:
+                return
+            self.drop(key)
+            self.entries[key] = ([dict(row) for row in rows], tables, steam_id, time.monotonic())
+            for table in tables:
+                self.by_table.setdefault(table, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self.drop(next(iter(self.entries)))
+
+    def drop(self, key: Tuple):
+        """Remove one entry; the caller holds the lock"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            for table in entry[1]:
+                self.by_table.get(table, set()).discard(key)
+
+    def invalidate(self, tables: Iterable[str], steam_id: Optional[int] = None):
+        with self.lock:
+            self.generation += 1
+            for table in cascaded_tables(tables):
+                for key in list(self.by_table.get(table, ())):
+                    scope = self.entries[key][2]
+                    if steam_id is None or scope is None or scope == steam_id:
+                        self.drop(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.by_table.clear()
+
+
+class DBManager:
+    """MySQL access layer backed by a per-thread connection pool"""
+
+    def __init__(self, pool_size: int = DB_POOL_SIZE, query_cache_size: int = DB_QUERY_CACHE_SIZE,
+                 **connect_kwargs):
+        self.pool_size = pool_size
+        self.connect_kwargs = {**DB_SETTINGS, **connect_kwargs}
+        self.pool: Optional[ConnectionPool] = None
+        self.local = threading.local()
+        self.cache = QueryCache(query_cache_size)
+        self.statement_bytes: Optional[int] = None
+        # Состояние profile_stats, по которому последний раз пересчитывались места
+        self.leaderboards_source: Optional[Tuple] = None
+        self.leaderboards_lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """Create the pool and verify that the database is reachable"""
+        if self.pool is not None:
+            return
+        self.pool = ConnectionPool(self.pool_size, **self.connect_kwargs)
+        try:
+            with self.checkout():
+                pass
+            print("Database connection established")
+        except pymysql.Error as e:
+            print(f"Database connection failed: {e}")
+            self.pool = None
+            raise
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a connection for the current thread; nested calls reuse it"""
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            self.local.depth += 1
+            try:
+                yield connection
+            finally:
+                self.local.depth -= 1
+            return
+
+        if self.pool is None:
+            self.connect()
+        pool = self.pool
+        connection = pool.acquire()
+        self.local.connection, self.local.depth = connection, 0
+        try:
+            yield connection
+        finally:
+            self.local.connection = None
+            pool.release(connection)
+
+    def execute_query(self, query: str, params: Tuple = None, cache: bool = False,
+                      steam_id: Optional[int] = None) -> Optional[List[Dict]]:
+        """Run a SELECT; with cache=True results are served from memory until a write touches them.
+
+        steam_id scopes a cached result to one profile, so writes to other
+        profiles do not evict it.
+        """
+        if cache:
+            key = (query, tuple(params or ()))
+            rows = self.cache.get(key)
+            if rows is not None:
+                metrics.increment("db_query_cache_total", result="hit")
+                return rows
+            metrics.increment("db_query_cache_total", result="miss")
+            generation = self.cache.generation
+
+        started = time.perf_counter() if metrics.enabled else 0.0
+        try:
+            with self.checkout() as connection, connection.cursor() as cursor:
+                cursor.execute(query, params or ())
+                rows = cursor.fetchall()
+        except pymysql.Error as e:
+            print(f"Query execution failed: {e}")
+            return None
+        if metrics.enabled:
+            metrics.record_query(query, time.perf_counter() - started, statement_kind(query), len(rows))
+        if cache:
+            tables = {table.lower() for table in READ_TABLES.findall(query)}
+            self.cache.put(key, rows, tables, int(steam_id) if steam_id is not None else None, generation)
+        return rows
+
+    def execute_update(self, query: str, params=None, many=False, steam_id: Optional[int] = None) -> bool:
+        """Run a write and evict cached reads of the tables it touched (only that profile's if steam_id is given)"""
+        started = time.perf_counter() if metrics.enabled else 0.0
+        try:
+            with self.checkout() as connection:
+                try:
+                    with connection.cursor() as cursor:
+                        if many:
+                            cursor.executemany(query, params)
+                        else:
+                            cursor.execute(query, params)
+                        connection.commit()
+                        rows = cursor.rowcount
+                except pymysql.Error:
+                    if connection.open:
+                        connection.rollback()
+                    raise
+        except pymysql.Error as e:
+            print(f"Update failed: {e}")
+            return False
+        # Upsert без фактических изменений возвращает 0 строк - кэш остаётся актуальным
+        if rows != 0:
+            self.cache.invalidate(WRITE_TABLES.findall(query), int(steam_id) if steam_id is not None else None)
+        if metrics.enabled:
+            metrics.record_query(query, time.perf_counter() - started, statement_kind(query), rows)
+            if many:
+                record_batch(query, len(params) if hasattr(params, "__len__") else rows)
+        return True
+
+    @contextmanager
+    def transaction(self, tables: Optional[Iterable[str]] = None, steam_id: Optional[int] = None):
+        """Run several statements on one cursor and commit them together.
+
+        Cached reads of `tables` are evicted after the commit; without tables the whole cache is.
+        """
+        with metrics.timer("db_transaction_seconds"), \
+                self.checkout() as connection, connection.cursor() as cursor:
+            connection.begin()
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                if connection.open:
+                    connection.rollback()
+                raise
+            finally:
+                if tables is None:
+                    self.cache.clear()
+                else:
+                    self.cache.invalidate(tables, int(steam_id) if steam_id is not None else None)
+
+    def invalidate(self, tables: Iterable[str], steam_id: Optional[int] = None):
+        """Evict cached reads after writes made outside execute_update/transaction bookkeeping"""
+        self.cache.invalidate(tables, int(steam_id) if steam_id is not None else None)
+
+    def bulk_statement_bytes(self) -> int:
+        """Largest INSERT statement to send: max_allowed_packet minus headroom, capped by DB_BULK_MAX_BYTES"""
+        if self.statement_bytes is None:
+            rows = self.execute_query("SELECT @@max_allowed_packet AS packet")
+            packet = int(rows[0]['packet']) if rows else 1024 * 1024
+            self.statement_bytes = max(64 * 1024, min(packet - 16 * 1024, DB_BULK_MAX_BYTES))
+        return self.statement_bytes
+
+    def insert_rows(self, cursor, table: str, columns: Tuple[str, ...], rows: List[Tuple],
+                    verb: str = "INSERT") -> int:
+        """Plain multi-row INSERT on the caller's cursor, split into statements that fit the packet limit"""
+        if not rows:
+            return 0
+        head = f"{verb} INTO {table} ({', '.join(columns)}) VALUES "
+        row_template = "(" + ",".join(["%s"] * len(columns)) + ")"
+        limit = self.bulk_statement_bytes()
+        values: List[str] = []
+        size = len(head)
+        for row in rows:
+            literal = cursor.mogrify(row_template, row)
+            length = len(literal.encode("utf-8")) + 1
+            if values and size + length > limit:
+                cursor.execute(head + ",".join(values))
+                values, size = [], len(head)
+            values.append(literal)
+            size += length
+        cursor.execute(head + ",".join(values))
+        metrics.observe("db_batch_rows", len(rows), SIZE_BUCKETS, table=table)
+        return len(rows)
+
+    def reconnect(self):
+        """Reconnect to the database"""
+        self.disconnect()
+        self.connect()
+
+    def disconnect(self):
+        """Close all pooled connections"""
+        if self.pool:
+            self.pool.close_all()
+            self.pool = None
+            print("Database connection closed")
+
+    # Profile-related operations
+    def get_profile_statistics(self, steam_id: str) -> Optional[Dict]:
+        """Read precomputed profile statistics by primary key"""
+        try:
+            steam_id_int = int(steam_id)
+        except ValueError:
+            return None
+        query = """
+            SELECT
+                p.steam_id,
+                p.nickname,
+                p.registration_date,
+                p.avatar_url,
+                COALESCE(s.total_achievements, 0) AS total_achievements,
+                COALESCE(s.total_games, 0) AS total_games,
+                COALESCE(s.completed_games, 0) AS completed_games,
+                COALESCE(s.total_playtime_hours, 0) AS total_playtime_hours,
+                COALESCE(s.rare_achievements, 0) AS rare_achievements,
+                COALESCE(s.avg_achievement_completion, 0) AS avg_achievement_completion,
+                s.updated_at AS stats_updated_at
+            FROM profiles p
+            LEFT JOIN profile_stats s ON s.profile_id = p.steam_id
+            WHERE p.steam_id = %s
+        """
+        result = self.execute_query(query, (steam_id_int,), cache=True, steam_id=steam_id_int)
+        # Профили, импортированные до появления profile_stats, пересчитываются при первом обращении
+        if result and result[0]['stats_updated_at'] is None:
+            self.refresh_profile_game_stats(steam_id_int)
+            self.refresh_profile_stats(steam_id_int)
+            result = self.execute_query(query, (steam_id_int,), cache=True, steam_id=steam_id_int)
+        return result
+
+    def refresh_profile_stats(self, steam_id: str) -> bool:
+        """Recompute the profile_stats summary row for one profile"""
+        try:
+            steam_id_int = int(steam_id)
+        except ValueError:
+            return False
+        query = """
+            INSERT INTO profile_stats (
+                profile_id, total_achievements, total_games, completed_games,
+                total_playtime_hours, rare_achievements, avg_achievement_completion, updated_at
+            )
+            SELECT
+                %s,
+                COALESCE(ach.unlocked, 0),
+                g.total_games,
+                done.completed_games,
+                COALESCE(g.playtime, 0) / 60,
+                COALESCE(ach.rare, 0),
+                COALESCE(ach.avg_completion, 0),
+                NOW()
+            FROM (
+                SELECT COUNT(*) AS total_games, SUM(playtime) AS playtime
+                FROM profile_games
+                WHERE profile_id = %s
+            ) g
+            CROSS JOIN (
+                SELECT
+                    SUM(pa.completeness = 1) AS unlocked,
+                    SUM(pa.completeness = 1 AND a.rarity < 10) AS rare,
+                    AVG(pa.completeness * 100) AS avg_completion
+                FROM profile_achievements pa
+                JOIN achievements a ON pa.achievement_id = a.id
+                WHERE pa.profile_id = %s
+            ) ach
+            CROSS JOIN (
+                SELECT COUNT(*) AS completed_games
+                FROM profile_game_stats
+                WHERE profile_id = %s
+                  AND total_achievements > 0
+                  AND unlocked_achievements = total_achievements
+            ) done
+            ON DUPLICATE KEY UPDATE
+                total_achievements = VALUES(total_achievements),
+                total_games = VALUES(total_games),
+                completed_games = VALUES(completed_games),
+                total_playtime_hours = VALUES(total_playtime_hours),
+                rare_achievements = VALUES(rare_achievements),
+                avg_achievement_completion = VALUES(avg_achievement_completion),
+                updated_at = VALUES(updated_at)
+        """
+        return self.execute_update(query, (steam_id_int,) * 4, steam_id=steam_id_int)
+
+    def refresh_profile_game_stats(self, steam_id: str, game_ids: Optional[List[int]] = None) -> bool:
+        """Recompute per-game achievement counts for a profile (all games if game_ids is None)"""
+        try:
+            steam_id_int = int(steam_id)
+        except ValueError:
+            return False
+        if game_ids is None:
+            games_filter = "SELECT game_id FROM profile_games WHERE profile_id = %s"
+            params = (steam_id_int, steam_id_int, steam_id_int)
+        elif game_ids:
+            games_filter = ",".join(["%s"] * len(game_ids))
+            params = (steam_id_int, steam_id_int, *game_ids)
+        else:
+            return True
+        query = f"""
+            INSERT INTO profile_game_stats (
+                profile_id, game_id, total_achievements, unlocked_achievements, completion_percent
+            )
+            SELECT
+                %s,
+                a.game_id,
+                COUNT(*),
+                COALESCE(SUM(pa.completeness = 1), 0),
+                ROUND(COALESCE(SUM(pa.completeness = 1), 0) * 100.0 / COUNT(*), 2)
+            FROM achievements a
+            LEFT JOIN profile_achievements pa
+                ON pa.achievement_id = a.id
+                AND pa.profile_id = %s
+            WHERE a.game_id IN ({games_filter})
+            GROUP BY a.game_id
+            ON DUPLICATE KEY UPDATE
+                total_achievements = VALUES(total_achievements),
+                unlocked_achievements = VALUES(unlocked_achievements),
+                completion_percent = VALUES(completion_percent)
+        """
+        return self.execute_update(query, params, steam_id=steam_id_int)
+
+    PROFILE_UPSERT_QUERY = """
+        INSERT INTO profiles (steam_id, nickname, registration_date, avatar_url)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE 
+            nickname = VALUES(nickname),
+            registration_date = VALUES(registration_date),
+            avatar_url = VALUES(avatar_url)
+    """
+
+    def insert_profile(self, nickname: str, steam_id: str,
+                       registration_date: datetime, avatar_url: str) -> bool:
+        try:
+            steam_id_int = int(steam_id)
+        except ValueError:
+            return False
+
+        return self.execute_update(
+            self.PROFILE_UPSERT_QUERY,
+            (steam_id_int, nickname, registration_date, avatar_url),
+            steam_id=steam_id_int
+        )
+
+    def insert_profiles(self, profiles: List[Tuple[int, str, datetime, str]]) -> bool:
+        """Upsert many (steam_id, nickname, registration_date, avatar_url) rows at once"""
+        if not profiles:
+            return True
+        return self.execute_update(self.PROFILE_UPSERT_QUERY, profiles, many=True)
+
+    def get_import_checkpoints(self, steam_id: str) -> set:
+        """App ids already committed by an unfinished import of this profile"""
+        rows = self.execute_query(
+            "SELECT app_id FROM import_checkpoints WHERE profile_id = %s", (int(steam_id),)
+        )
+        return {row['app_id'] for row in rows or []}
+
+    def add_import_checkpoints(self, steam_id: str, app_ids: List[int]) -> bool:
+        """Record a committed chunk of an import in a single statement"""
+        if not app_ids:
+            return True
+        steam_id_int = int(steam_id)
+        return self.execute_update(
+            """INSERT IGNORE INTO import_checkpoints (profile_id, app_id, imported_at)
+               VALUES (%s, %s, NOW())""",
+            [(steam_id_int, app_id) for app_id in app_ids],
+            many=True,
+            steam_id=steam_id_int
+        )
+
+    def clear_import_checkpoints(self, steam_id: str) -> bool:
+        return self.execute_update(
+            "DELETE FROM import_checkpoints WHERE profile_id = %s", (int(steam_id),), steam_id=int(steam_id)
+        )
+
+    def get_unfinished_imports(self) -> List[int]:
+        """Profiles whose last full import was interrupted"""
+        rows = self.execute_query("SELECT DISTINCT profile_id FROM import_checkpoints")
+        return [row['profile_id'] for row in rows or []]
+
+    def record_sync(self, steam_id: str, changed_games: int) -> bool:
+        """Remember when a profile was last synced and how much had changed"""
+        return self.execute_update(
+            """INSERT INTO profile_sync_state (profile_id, last_synced_at, last_changed_games)
+               VALUES (%s, NOW(), %s)
+               ON DUPLICATE KEY UPDATE
+                   last_synced_at = VALUES(last_synced_at),
+                   last_changed_games = VALUES(last_changed_games)""",
+            (int(steam_id), changed_games),
+            steam_id=int(steam_id)
+        )
+
+    def get_sync_candidates(self) -> List[Dict]:
+        """All profiles with their last sync time (NULL if never synced) and activity"""
+        return self.execute_query(
+            """SELECT p.steam_id, s.last_synced_at, COALESCE(s.last_changed_games, 0) AS last_changed_games
+               FROM profiles p
+               LEFT JOIN profile_sync_state s ON s.profile_id = p.steam_id"""
+        ) or []
+
+    def get_profile_steam_ids(self) -> List[int]:
+        """Get steam_ids of all tracked profiles"""
+        rows = self.execute_query("SELECT steam_id FROM profiles")
+        return [row['steam_id'] for row in rows or []]
+
+    def get_profile_games(self, steam_id: str) -> List[Dict]:
+        """Get games with completion stats for a profile using steam_id"""
+        query = """
+            SELECT 
+                g.name,
+                COALESCE(s.total_achievements, 0) AS total_achievements,
+                COALESCE(s.unlocked_achievements, 0) AS completed_achievements,
+                COALESCE(s.completion_percent, 0) AS completion_percent
+            FROM profile_games pg
+            JOIN games g ON pg.game_id = g.app_id
+            LEFT JOIN profile_game_stats s
+                ON s.profile_id = pg.profile_id
+                AND s.game_id = pg.game_id
+            WHERE pg.profile_id = %s
+            ORDER BY g.name
+        """
+        return self.execute_query(query, (steam_id,), cache=True, steam_id=steam_id)
+
+    # Допустимые столбцы сортировки списка игр; app_id делает порядок однозначным
+    GAME_SORT_COLUMNS = {
+        "name": "g.name",
+        "total_achievements": "total_achievements",
+        "completed_achievements": "completed_achievements",
+        "completion_percent": "completion_percent",
+    }
+    GAME_COMPLETION_FILTERS = {
+        "completed": "COALESCE(s.completion_percent, 0) >= 100",
+        "in_progress": "COALESCE(s.completion_percent, 0) > 0 AND COALESCE(s.completion_percent, 0) < 100",
+        "not_started": "COALESCE(s.completion_percent, 0) = 0",
+    }
+
+    def get_profile_games_page(self, steam_id: str, offset: int = 0, limit: int = 50,
+                               sort: str = "name", descending: bool = False,
+                               name_filter: Optional[str] = None,
+                               completion: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """One page of a profile's games, sorted and filtered in SQL; returns (rows, total matches)"""
+        where = ["pg.profile_id = %s"]
+        params: List = [steam_id]
+        if name_filter:
+            # Экранируем спецсимволы LIKE, чтобы искать по буквальной подстроке
+            escaped = name_filter.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("g.name LIKE %s")
+            params.append(f"%{escaped}%")
+        if completion in self.GAME_COMPLETION_FILTERS:
+            where.append(self.GAME_COMPLETION_FILTERS[completion])
+        where_sql = " AND ".join(where)
+
+        joins = """
+            FROM profile_games pg
+            JOIN games g ON pg.game_id = g.app_id
+            LEFT JOIN profile_game_stats s
+                ON s.profile_id = pg.profile_id
+                AND s.game_id = pg.game_id
+        """
+        count = self.execute_query(f"SELECT COUNT(*) AS total {joins} WHERE {where_sql}", tuple(params),
+                                   cache=True, steam_id=steam_id)
+        total = count[0]['total'] if count else 0
+        if not total:
+            return [], 0
+
+        direction = "DESC" if descending else "ASC"
+        order_by = self.GAME_SORT_COLUMNS.get(sort, "g.name")
+        query = f"""
+            SELECT 
+                g.app_id,
+                g.name,
+                COALESCE(s.total_achievements, 0) AS total_achievements,
+                COALESCE(s.unlocked_achievements, 0) AS completed_achievements,
+                COALESCE(s.completion_percent, 0) AS completion_percent
+            {joins}
+            WHERE {where_sql}
+            ORDER BY {order_by} {direction}, g.app_id {direction}
+            LIMIT %s OFFSET %s
+        """
+        rows = self.execute_query(query, (*params, max(1, limit), max(0, offset)), cache=True, steam_id=steam_id)
+        return rows or [], total
+
+    def get_profile_id_by_steam_id(self, steam_id: str) -> Optional[int]:
+        """Get profile ID by steam_id"""
+        query = """
+            SELECT id FROM profiles WHERE steam_id = %s
+        """
+        result = self.execute_query(query, (steam_id,), cache=True, steam_id=steam_id)
+        return result[0]['id'] if result else None
+
+    def get_profile_nickname_by_steam_id(self, steam_id: str) -> Optional[str]:
+        """Get profile nickname by steam_id"""
+        query = """
+            SELECT nickname FROM profiles WHERE steam_id = %s
+        """
+        result = self.execute_query(query, (steam_id,), cache=True, steam_id=steam_id)
+        return result[0].get('nickname') if result else None
+
+    # Leaderboards and comparison
+    # Метрика таблицы лидеров -> столбец profile_stats
+    LEADERBOARD_METRICS = {
+        "completed_games": "completed_games",
+        "total_achievements": "total_achievements",
+        "rare_achievements": "rare_achievements",
+        "avg_achievement_completion": "avg_achievement_completion",
+        "total_playtime_hours": "total_playtime_hours",
+    }
+
+    def leaderboards_source_state(self) -> Optional[Tuple]:
+        """(profile count, latest profile_stats.updated_at): changes whenever a rebuild would change ranks"""
+        rows = self.execute_query("SELECT COUNT(*) AS profiles, MAX(updated_at) AS updated_at FROM profile_stats")
+        return (rows[0]['profiles'], rows[0]['updated_at']) if rows else None
+
+    def refresh_leaderboards(self, force: bool = False) -> bool:
+        """Recompute leaderboard_ranks for every metric in one transaction if profile_stats changed.
+
+        The rebuild rewrites one row per profile and metric, so callers run it
+        off the UI thread; concurrent calls return immediately.
+        """
+        if not self.leaderboards_lock.acquire(blocking=False):
+            return True  # Пересчёт уже идёт в другом потоке
+        try:
+            source = self.leaderboards_source_state()
+            if source is None:
+                return False
+            if not force and source == self.leaderboards_source:
+                return True
+            with self.transaction(tables=("leaderboard_ranks",)) as cursor:
+                cursor.execute("DELETE FROM leaderboard_ranks")
+                for metric, column in self.LEADERBOARD_METRICS.items():
+                    cursor.execute(
+                        f"""INSERT INTO leaderboard_ranks (metric, profile_id, position, value)
+                            SELECT %s, profile_id, RANK() OVER (ORDER BY {column} DESC), {column}
+                            FROM profile_stats""",
+                        (metric,)
+                    )
+            # Состояние прочитано до пересчёта: изменения во время него вызовут следующий пересчёт
+            self.leaderboards_source = source
+            return True
+        except pymysql.Error as e:
+            print(f"Leaderboard refresh failed: {e}")
+            return False
+        finally:
+            self.leaderboards_lock.release()
+
+    def get_leaderboard(self, metric: str, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Top profiles for a metric; reads the precomputed ranks through metric_position_idx"""
+        if metric not in self.LEADERBOARD_METRICS:
+            raise ValueError(f"Unknown leaderboard metric: {metric}")
+        query = """
+            SELECT r.position, r.value, p.steam_id, p.nickname
+            FROM leaderboard_ranks r
+            JOIN profiles p ON p.steam_id = r.profile_id
+            WHERE r.metric = %s
+            ORDER BY r.position, r.profile_id
+            LIMIT %s OFFSET %s
+        """
+        return self.execute_query(query, (metric, max(1, limit), max(0, offset)), cache=True) or []
+
+    def get_profile_ranks(self, steam_id: str) -> Dict[str, Dict]:
+        """Position and value of one profile on every leaderboard"""
+        steam_id_int = int(steam_id)
+        rows = self.execute_query(
+            "SELECT metric, position, value FROM leaderboard_ranks WHERE profile_id = %s",
+            (steam_id_int,),
+            cache=True,
+            steam_id=steam_id_int
+        )
+        return {row['metric']: row for row in rows or []}
+
+    def compare_profiles(self, steam_ids: List[str]) -> List[Dict]:
+        """Side-by-side statistics and ranks for several profiles"""
+        ids = [int(steam_id) for steam_id in steam_ids]
+        if not ids:
+            return []
+        placeholders = ",".join(["%s"] * len(ids))
+        rows = self.execute_query(
+            f"""SELECT p.steam_id, p.nickname, s.total_games, s.completed_games, s.total_achievements,
+                       s.rare_achievements, s.avg_achievement_completion, s.total_playtime_hours
+                FROM profiles p
+                JOIN profile_stats s ON s.profile_id = p.steam_id
+                WHERE p.steam_id IN ({placeholders})""",
+            tuple(ids)
+        ) or []
+        ranks = self.execute_query(
+            f"SELECT profile_id, metric, position FROM leaderboard_ranks WHERE profile_id IN ({placeholders})",
+            tuple(ids)
+        ) or []
+        positions: Dict[int, Dict[str, int]] = {}
+        for rank in ranks:
+            positions.setdefault(rank['profile_id'], {})[rank['metric']] = rank['position']
+        for row in rows:
+            row['ranks'] = positions.get(row['steam_id'], {})
+        return rows
+
+    def get_game_completions(self, game_id: int, limit: int = 100) -> List[Dict]:
+        """Profiles that unlocked every achievement of a game (covered by game_completion_idx)"""
+        query = """
+            SELECT p.steam_id, p.nickname, s.total_achievements
+            FROM profile_game_stats s
+            JOIN profiles p ON p.steam_id = s.profile_id
+            WHERE s.game_id = %s AND s.completion_percent >= 100
+            ORDER BY p.nickname
+            LIMIT %s
+        """
+        return self.execute_query(query, (game_id, max(1, limit)), cache=True) or []
+
+    def get_rarest_unlocks(self, limit: int = 50, steam_id: Optional[str] = None) -> List[Dict]:
+        """Rarest achievements unlocked by tracked profiles (or by one profile), rarest first.
+
+        Walks achievements in rarity_idx order (rarity, then the implicit id) and
+        probes achievement_unlocks_idx, so it stops after `limit` matches instead
+        of scanning every unlock. Profiles sharing one achievement come in index
+        order. Achievements with unknown global rarity (NULL) are skipped.
+        """
+        profile_filter = "AND pa.profile_id = %s" if steam_id is not None else ""
+        params = (int(steam_id),) if steam_id is not None else ()
+        query = f"""
+            SELECT a.achievement_name, a.display_name, a.icon, a.rarity,
+                   g.name AS game_name, p.steam_id, p.nickname
+            FROM achievements a
+            JOIN profile_achievements pa
+                ON pa.achievement_id = a.id
+                AND pa.completeness = 1
+                {profile_filter}
+            JOIN profiles p ON p.steam_id = pa.profile_id
+            JOIN games g ON g.app_id = a.game_id
+            WHERE a.rarity IS NOT NULL
+            ORDER BY a.rarity, a.id
+            LIMIT %s
+        """
+        return self.execute_query(query, (*params, max(1, limit)), cache=True,
+                                  steam_id=params[0] if params else None) or []
+
+    # Playtime history
+    PLAYTIME_PERIODS = ("day", "week")
+
+    def write_playtime_deltas(self, cursor, steam_id: str, deltas: List[Tuple[int, int, datetime]]):
+        """Store (game_id, minutes, played_at) increments and add them to the day/week buckets.
+
+        Runs on the caller's transaction cursor, so the deltas commit together with the new playtime.
+        """
+        if not deltas:
+            return
+        steam_id_int = int(steam_id)
+        buckets: Dict[Tuple[str, date, int], int] = {}
+        for game_id, minutes, played_at in deltas:
+            day = played_at.date()
+            for period, start in (("day", day), ("week", day - timedelta(days=day.weekday()))):
+                buckets[(period, start, game_id)] = buckets.get((period, start, game_id), 0) + minutes
+
+        cursor.executemany(
+            """INSERT INTO playtime_deltas (profile_id, recorded_at, game_id, minutes)
+               VALUES (%s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE minutes = minutes + VALUES(minutes)""",
+            [(steam_id_int, played_at, game_id, minutes) for game_id, minutes, played_at in deltas]
+        )
+        cursor.executemany(
+            """INSERT INTO playtime_buckets (profile_id, period, bucket_start, game_id, minutes)
+               VALUES (%s, %s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE minutes = minutes + VALUES(minutes)""",
+            [(steam_id_int, period, start, game_id, minutes)
+             for (period, start, game_id), minutes in buckets.items()]
+        )
+
+    def get_playtime_history(self, steam_id: str, period: str = "day", since: Optional[date] = None,
+                             until: Optional[date] = None, game_id: Optional[int] = None) -> List[Dict]:
+        """Hours played per day or week (bucket_start, hours), oldest first, read from the pre-rolled buckets"""
+        if period not in self.PLAYTIME_PERIODS:
+            raise ValueError(f"Unknown playtime period: {period}")
+        steam_id_int = int(steam_id)
+        conditions = ["profile_id = %s", "period = %s"]
+        params: List = [steam_id_int, period]
+        if since is not None:
+            conditions.append("bucket_start >= %s")
+            params.append(since)
+        if until is not None:
+            conditions.append("bucket_start <= %s")
+            params.append(until)
+        if game_id is not None:
+            conditions.append("game_id = %s")
+            params.append(game_id)
+        query = f"""
+            SELECT bucket_start, SUM(minutes) / 60 AS hours
+            FROM playtime_buckets
+            WHERE {' AND '.join(conditions)}
+            GROUP BY bucket_start
+            ORDER BY bucket_start
+        """
+        return self.execute_query(query, tuple(params), cache=True, steam_id=steam_id_int) or []
+
+    def get_playtime_partitions(self) -> List[str]:
+        rows = self.execute_query(
+            """SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'playtime_deltas'
+               ORDER BY PARTITION_ORDINAL_POSITION"""
+        ) or []
+        return [row['name'] for row in rows if row['name']]
+
+    def maintain_playtime_partitions(self, months_ahead: int = PLAYTIME_PARTITIONS_AHEAD,
+                                     retention_days: int = PLAYTIME_DELTA_RETENTION_DAYS) -> bool:
+        """Split monthly partitions off p_future ahead of time and drop raw deltas past retention.
+
+        Dropping a partition is a metadata operation, unlike DELETE over millions
+        of rows; the day/week buckets keep the history. Runs when the UI backend
+        starts and on every sync_daemon rescan.
+        """
+        partitions = self.get_playtime_partitions()
+        if "p_future" not in partitions:
+            print("playtime_deltas is not partitioned, skipping maintenance.")
+            return False
+        monthly = sorted(name for name in partitions if re.fullmatch(r"p\d{6}", name))
+        today = date.today()
+
+        # Раздел pYYYYMM хранит строки до начала следующего месяца
+        last = date(int(monthly[-1][1:5]), int(monthly[-1][5:7]), 1) if monthly else month_start(today, -1)
+        missing = []
+        month = month_start(last, 1)
+        while month <= month_start(today, months_ahead):
+            missing.append(month)
+            month = month_start(month, 1)
+        cutoff = today - timedelta(days=retention_days)
+        # Самый новый раздел не удаляется, даже если он старше срока хранения
+        expired = [name for name in monthly[:-1]
+                   if month_start(date(int(name[1:5]), int(name[5:7]), 1), 1) <= cutoff]
+
+        if not missing and not expired:
+            return True
+
+        # DDL фиксируется неявно, поэтому транзакция не нужна: каждый ALTER выполняется сам по себе
+        try:
+            with self.checkout() as connection, connection.cursor() as cursor:
+                if missing:
+                    definitions = ", ".join(
+                        f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{month_start(month, 1):%Y-%m-%d}')"
+                        for month in missing
+                    )
+                    cursor.execute(
+                        f"""ALTER TABLE playtime_deltas REORGANIZE PARTITION p_future INTO
+                            ({definitions}, PARTITION p_future VALUES LESS THAN (MAXVALUE))"""
+                    )
+                if expired:
+                    cursor.execute(f"ALTER TABLE playtime_deltas DROP PARTITION {', '.join(expired)}")
+        except pymysql.Error as e:
+            print(f"Playtime partition maintenance failed: {e}")
+            return False
+        self.invalidate(("playtime_deltas",))
+        return True
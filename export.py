@@ -0,0 +1,224 @@
+"""Incremental columnar export of the achievements dataset for offline analysis.
+
+    python export.py [--dir export] [--format parquet|arrow] [--full]
+
+Rows are streamed with server-side cursors and written chunk by chunk, so
+neither MySQL nor this process holds a whole table in memory. Shared tables
+(profiles, games, achievements) are rewritten on every run; per-profile
+tables are written to one file per profile and only re-exported when the
+profile's statistics changed since the last export. Read the result with
+pyarrow.dataset.dataset("export/profile_achievements", format="parquet"),
+or memory-map the .arrow files with pyarrow.memory_map.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Optional, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения до импорта модулей, читающих их при загрузке
+load_dotenv()
+
+import pymysql
+
+from db import DBManager
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "export"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+STATE_FILE = "_state.json"
+
+# (имя столбца, тип Arrow) в порядке SELECT; типы повторяют structure.sql
+TABLES: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {
+    "profiles": ("steam_id", [
+        ("steam_id", "int64"), ("nickname", "string"),
+        ("registration_date", "timestamp"), ("avatar_url", "string"),
+    ]),
+    "games": ("app_id", [("app_id", "int32"), ("name", "string"), ("icon_url", "string")]),
+    "achievements": ("id", [
+        ("id", "int32"), ("game_id", "int32"), ("achievement_name", "string"), ("rarity", "decimal5"),
+        ("display_name", "string"), ("description", "string"), ("icon", "string"), ("icon_gray", "string"),
+    ]),
+    "profile_games": ("game_id", [
+        ("profile_id", "int64"), ("game_id", "int32"),
+        ("playtime", "decimal8"), ("rtime_last_played", "uint32"),
+    ]),
+    "profile_achievements": ("achievement_id", [
+        ("profile_id", "int64"), ("achievement_id", "int32"), ("completeness", "int8"),
+    ]),
+}
+SHARED_TABLES = ("profiles", "games", "achievements")
+PROFILE_TABLES = ("profile_games", "profile_achievements")
+
+
+def arrow_schema(columns: List[Tuple[str, str]]) -> "pa.Schema":
+    types = {
+        "int8": pa.int8(), "int32": pa.int32(), "int64": pa.int64(), "uint32": pa.uint32(),
+        "string": pa.string(), "timestamp": pa.timestamp("s"),
+        "decimal5": pa.decimal128(5, 2), "decimal8": pa.decimal128(8, 2),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class ColumnarWriter:
+    """Writes record batches to a Parquet or Arrow IPC file, replacing it atomically on close"""
+
+    def __init__(self, path: str, schema: "pa.Schema", file_format: str, compression: Optional[str]):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(self.tmp_path, schema, compression=compression or "none")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self.writer = pa.ipc.new_file(self.tmp_path, schema, options=options)
+        self.rows = 0
+
+    def write(self, batch: "pa.RecordBatch"):
+        self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.writer.close()
+        os.remove(self.tmp_path)
+
+
+class DatasetExporter:
+    """Streams tables out of MySQL into columnar files, incrementally per profile"""
+
+    def __init__(self, db: DBManager, directory: str = EXPORT_DIR, file_format: str = "parquet",
+                 compression: Optional[str] = EXPORT_COMPRESSION, chunk_rows: int = EXPORT_CHUNK_ROWS):
+        self.db = db
+        self.directory = directory
+        self.file_format = file_format
+        self.extension = ".parquet" if file_format == "parquet" else ".arrow"
+        self.compression = compression
+        self.chunk_rows = chunk_rows
+        self.state_path = os.path.join(directory, STATE_FILE)
+
+    def load_state(self) -> Dict:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {"profiles": {}}
+        # Выгрузка в другом формате не может переиспользовать старые файлы
+        if state.get("format") != self.file_format:
+            return {"profiles": {}}
+        return state
+
+    def save_state(self, state: Dict):
+        state["format"] = self.file_format
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=1)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def stream(self, table: str, path: str, steam_id: Optional[int] = None) -> int:
+        """Copy one table (or one profile's rows) into a file through an unbuffered cursor"""
+        order_by, columns = TABLES[table]
+        schema = arrow_schema(columns)
+        query = f"SELECT {', '.join(name for name, _ in columns)} FROM {table}"
+        params: Tuple = ()
+        if steam_id is not None:
+            query += " WHERE profile_id = %s"
+            params = (steam_id,)
+        query += f" ORDER BY {order_by}"
+
+        writer = ColumnarWriter(path, schema, self.file_format, self.compression)
+        try:
+            # SSCursor читает строки с сервера по мере обработки, не буферизуя весь результат
+            with self.db.checkout() as connection, connection.cursor(pymysql.cursors.SSCursor) as cursor:
+                cursor.execute(query, params)
+                while rows := cursor.fetchmany(self.chunk_rows):
+                    arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                    writer.write(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+        return writer.rows
+
+    def changed_profiles(self, exported: Dict[str, str]) -> Tuple[Dict[str, str], List[str]]:
+        """Profiles whose statistics changed since their last export, and profiles that were deleted"""
+        rows = self.db.execute_query(
+            """SELECT p.steam_id, s.updated_at
+               FROM profiles p
+               LEFT JOIN profile_stats s ON s.profile_id = p.steam_id"""
+        ) or []
+        # updated_at меняется при каждом пересчёте profile_stats после импорта или синхронизации
+        current = {str(row['steam_id']): str(row['updated_at']) for row in rows}
+        changed = {steam_id: marker for steam_id, marker in current.items() if exported.get(steam_id) != marker}
+        removed = [steam_id for steam_id in exported if steam_id not in current]
+        return changed, removed
+
+    def export(self, full: bool = False) -> Dict[str, int]:
+        """Run one export pass; returns rows written per table"""
+        os.makedirs(self.directory, exist_ok=True)
+        for table in PROFILE_TABLES:
+            os.makedirs(os.path.join(self.directory, table), exist_ok=True)
+        state = {"profiles": {}} if full else self.load_state()
+        written = {table: 0 for table in TABLES}
+
+        for table in SHARED_TABLES:
+            written[table] = self.stream(table, os.path.join(self.directory, table + self.extension))
+
+        changed, removed = self.changed_profiles(state["profiles"])
+        for steam_id in removed:
+            for table in PROFILE_TABLES:
+                path = os.path.join(self.directory, table, steam_id + self.extension)
+                if os.path.exists(path):
+                    os.remove(path)
+            del state["profiles"][steam_id]
+
+        for i, (steam_id, marker) in enumerate(changed.items(), 1):
+            for table in PROFILE_TABLES:
+                path = os.path.join(self.directory, table, steam_id + self.extension)
+                written[table] += self.stream(table, path, int(steam_id))
+            state["profiles"][steam_id] = marker
+            # Состояние сохраняется по ходу, чтобы прерванная выгрузка продолжилась с места остановки
+            if i % 50 == 0:
+                self.save_state(state)
+            print(f"Exported profile {steam_id} ({i}/{len(changed)})")
+
+        self.save_state(state)
+        print(f"Export finished: {len(changed)} profiles updated, {len(removed)} removed")
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the dataset to Parquet/Arrow files for offline analysis")
+    parser.add_argument("--dir", default=EXPORT_DIR, help="output directory")
+    parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--compression", default=EXPORT_COMPRESSION,
+                        help="zstd, lz4, snappy (parquet only) or none")
+    parser.add_argument("--full", action="store_true", help="re-export every profile")
+    args = parser.parse_args()
+
+    if pa is None:
+        print("pyarrow is required for export: pip install pyarrow")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    db = DBManager()
+    try:
+        written = DatasetExporter(db, args.dir, args.format,
+                                  None if args.compression == "none" else args.compression).export(args.full)
+    finally:
+        db.disconnect()
+    print("Rows written:", written, f"({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,762 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Dict, List, Tuple
+
+import pymysql
+
+from db import DBManager
+from metrics import SIZE_BUCKETS, metrics
+from steam_api import SteamAPIManager, app_icon_url
+
+# Количество параллельных запросов достижений при импорте профиля
+FETCH_WORKERS = int(os.getenv("STEAM_FETCH_WORKERS", "8"))
+# Время жизни и размер кэша глобальной редкости достижений
+RARITY_CACHE_TTL_HOURS = float(os.getenv("RARITY_CACHE_TTL_HOURS", "24"))
+RARITY_CACHE_SIZE = int(os.getenv("RARITY_CACHE_SIZE", "5000"))
+# Сколько игр обрабатывается и записывается в БД за один шаг импорта
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "200"))
+# Первичный импорт пишет новые строки многострочными INSERT вместо upsert
+IMPORT_FAST_LOAD = os.getenv("IMPORT_FAST_LOAD", "1").lower() in ("1", "true", "yes")
+
+# progress(processed, total); может выбросить исключение, чтобы прервать импорт
+ProgressCallback = Callable[[int, int], None]
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class RarityCache:
+    """Global achievement percentages shared across imports.
+
+    Recently used apps are kept in an in-memory LRU; the persistent copy is the
+    achievements.rarity column, with rarity_cache recording when each app was
+    last refreshed from Steam.
+    """
+
+    def __init__(self, db: DBManager, api: SteamAPIManager,
+                 ttl_hours: float = RARITY_CACHE_TTL_HOURS, max_size: int = RARITY_CACHE_SIZE):
+        self.db = db
+        self.api = api
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_size = max_size
+        self.entries: "OrderedDict[int, Tuple[datetime, Dict[str, float]]]" = OrderedDict()
+        self.pending = set()  # app_id, полученные из сети и ещё не сохранённые
+        self.lock = threading.Lock()
+
+    def put(self, app_id: int, refreshed_at: datetime, rarities: Dict[str, float]):
+        with self.lock:
+            self.entries[app_id] = (refreshed_at, rarities)
+            self.entries.move_to_end(app_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def lookup(self, app_id: int, stale: bool = False) -> Optional[Dict[str, float]]:
+        """Return cached percentages without touching the network; expired ones only if stale=True"""
+        with self.lock:
+            entry = self.entries.get(app_id)
+            if entry is None:
+                return None
+            refreshed_at, rarities = entry
+            if not stale and datetime.now() - refreshed_at > self.ttl:
+                return None
+            self.entries.move_to_end(app_id)
+            return rarities
+
+    def get(self, app_id: int) -> Optional[Dict[str, float]]:
+        """Fresh percentages for an app; on a failed fetch the expired entry if any, otherwise None"""
+        if (rarities := self.lookup(app_id)) is not None:
+            return rarities
+
+        rarities = self.api.get_achievement_schema(app_id)
+        if rarities is None:
+            # Ошибки не кэшируются; устаревшие значения лучше, чем никаких
+            return self.lookup(app_id, stale=True)
+        self.put(app_id, datetime.now(), rarities)
+        with self.lock:
+            self.pending.add(app_id)
+        return rarities
+
+    def preload(self, app_ids: List[int]):
+        """Warm the LRU from the database for apps refreshed within the TTL"""
+        missing = [app_id for app_id in app_ids if self.lookup(app_id) is None]
+        cutoff = datetime.now() - self.ttl
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            placeholders = ",".join(["%s"] * len(chunk))
+            rows = self.db.execute_query(
+                f"""SELECT c.app_id, c.refreshed_at, a.achievement_name, a.rarity
+                    FROM rarity_cache c
+                    JOIN achievements a ON a.game_id = c.app_id
+                    WHERE c.app_id IN ({placeholders}) AND c.refreshed_at >= %s""",
+                (*chunk, cutoff)
+            ) or []
+
+            loaded: Dict[int, Tuple[datetime, Dict[str, float]]] = {}
+            for row in rows:
+                refreshed_at, rarities = loaded.setdefault(row['app_id'], (row['refreshed_at'], {}))
+                if row['rarity'] is not None:
+                    rarities[row['achievement_name']] = float(row['rarity'])
+            for app_id, (refreshed_at, rarities) in loaded.items():
+                self.put(app_id, refreshed_at, rarities)
+
+    def persist(self, app_ids: Iterable[int]):
+        """Record refresh times for apps whose fetched rarities this import has stored in achievements"""
+        with self.lock:
+            ready = self.pending.intersection(app_ids)
+            self.pending -= ready
+            pending = [(app_id, self.entries[app_id][0]) for app_id in ready if app_id in self.entries]
+        if pending:
+            self.db.execute_update(
+                """INSERT INTO rarity_cache (app_id, refreshed_at)
+                   VALUES (%s, %s)
+                   ON DUPLICATE KEY UPDATE refreshed_at = VALUES(refreshed_at)""",
+                pending,
+                many=True
+            )
+
+
+class SchemaCache:
+    """Achievement schemas (display names, descriptions, icons) fetched once per app.
+
+    schema_cache stores the achievement count each app's schema was fetched
+    for; the schema is fetched again only when GetGlobalAchievementPercentagesForApp
+    reports a different count, i.e. the game gained or lost achievements.
+    """
+
+    def __init__(self, db: DBManager, api: SteamAPIManager):
+        self.db = db
+        self.api = api
+        self.versions: Dict[int, int] = {}  # app_id -> число достижений сохранённой схемы
+        self.fetching = set()
+        self.pending: Dict[int, Tuple[int, List[Dict], Dict[str, float]]] = {}
+        self.lock = threading.Lock()
+
+    def preload(self, app_ids: List[int]):
+        """Load stored schema versions so known apps are not requested again"""
+        with self.lock:
+            missing = [app_id for app_id in app_ids if app_id not in self.versions]
+        for chunk in chunked(missing, 500):
+            placeholders = ",".join(["%s"] * len(chunk))
+            rows = self.db.execute_query(
+                f"SELECT app_id, achievement_count FROM schema_cache WHERE app_id IN ({placeholders})",
+                tuple(chunk)
+            ) or []
+            with self.lock:
+                self.versions.update((row['app_id'], row['achievement_count']) for row in rows)
+
+    def refresh(self, app_id: int, rarities: Dict[str, float]):
+        """Fetch the app's schema if the stored one is missing or has a different achievement count"""
+        count = len(rarities)
+        with self.lock:
+            if not count or self.versions.get(app_id) == count or app_id in self.fetching or app_id in self.pending:
+                return
+            self.fetching.add(app_id)
+        try:
+            schema = self.api.get_game_schema(app_id)
+        finally:
+            with self.lock:
+                self.fetching.discard(app_id)
+        if schema:
+            with self.lock:
+                self.pending[app_id] = (count, schema, rarities)
+
+    def persist(self, app_ids: Iterable[int]):
+        """Store fetched schemas for apps whose games rows are already written"""
+        with self.lock:
+            ready = {app_id: self.pending.pop(app_id) for app_id in set(app_ids) if app_id in self.pending}
+        if not ready:
+            return
+
+        # Строки достижений создаются здесь же, если импорт ещё не записал их
+        rows = [
+            (app_id, ach['name'], rarities.get(ach['name']), ach.get('displayName'),
+             ach.get('description'), ach.get('icon'), ach.get('icongray'))
+            for app_id, (_, schema, rarities) in ready.items()
+            for ach in schema if ach.get('name')
+        ]
+        if not self.db.execute_update(self.ACHIEVEMENTS_SCHEMA_QUERY, rows, many=True):
+            return
+        now = datetime.now()
+        if self.db.execute_update(
+            """INSERT INTO schema_cache (app_id, achievement_count, fetched_at)
+               VALUES (%s, %s, %s)
+               ON DUPLICATE KEY UPDATE achievement_count = VALUES(achievement_count),
+                                       fetched_at = VALUES(fetched_at)""",
+            [(app_id, count, now) for app_id, (count, _, _) in ready.items()],
+            many=True
+        ):
+            with self.lock:
+                self.versions.update((app_id, count) for app_id, (count, _, _) in ready.items())
+
+    ACHIEVEMENTS_SCHEMA_QUERY = """
+        INSERT INTO achievements (game_id, achievement_name, rarity, display_name, description, icon, icon_gray)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            display_name = VALUES(display_name),
+            description = VALUES(description),
+            icon = VALUES(icon),
+            icon_gray = VALUES(icon_gray)
+    """
+
+
+class ProfileImporter:
+    """Crawls Steam for a profile and writes games and achievements to the database.
+
+    Has no UI dependencies so it can run on background threads; progress is
+    reported through an optional callback.
+    """
+
+    def __init__(self, api: SteamAPIManager, db: DBManager, rarity_cache: Optional[RarityCache] = None,
+                 workers: int = FETCH_WORKERS, chunk_size: int = IMPORT_CHUNK_SIZE,
+                 fast_load: bool = IMPORT_FAST_LOAD, schema_cache: Optional[SchemaCache] = None):
+        self.api = api
+        self.db = db
+        self.rarity_cache = rarity_cache or RarityCache(db, api)
+        self.schema_cache = schema_cache or SchemaCache(db, api)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.fast_load = fast_load
+
+    @staticmethod
+    def offset_progress(progress: Optional[ProgressCallback], offset: int,
+                        expected: Dict[str, int]) -> Optional[ProgressCallback]:
+        """Translate per-chunk progress into progress over the whole stream"""
+        if progress is None:
+            return None
+        return lambda processed, total: progress(offset + processed,
+                                                 max(expected.get("total", 0), offset + total))
+
+    def fetch_game_achievements(self, steam_id: str, game_id: int
+                                ) -> Optional[Tuple[List[Dict], Dict[str, float]]]:
+        """Fetch player achievements, global percentages and (once per app) the achievement schema.
+
+        Returns None if the player's achievements could not be fetched.
+        """
+        player_achievements = self.api.get_player_achievements(steam_id, game_id)
+        if player_achievements is None:
+            return None
+        # Глобальная статистика нужна только если у игрока есть достижения
+        if not player_achievements:
+            return player_achievements, {}
+        rarities = self.rarity_cache.get(game_id)
+        if rarities is None:
+            # Редкость неизвестна: в achievements попадёт NULL и сохранённые значения останутся
+            return player_achievements, {}
+        self.schema_cache.refresh(game_id, rarities)
+        return player_achievements, rarities
+
+    def fetch_achievements_concurrently(self, steam_id: str, games: List[Dict],
+                                        progress: Optional[ProgressCallback] = None
+                                        ) -> Dict[int, Optional[Tuple[List[Dict], Dict[str, float]]]]:
+        """Fan out per-game achievement requests over a bounded thread pool; failed games map to None"""
+        progress = progress or (lambda processed, total: None)
+        total_games = len(games)
+        stats_games = [g['appid'] for g in games if g.get('has_community_visible_stats', 0) == 1]
+        # Игры без статистики обрабатываются сразу
+        processed = total_games - len(stats_games)
+        if total_games and processed:
+            progress(processed, total_games)
+
+        # Свежая редкость и сохранённые схемы из БД избавляют от запросов к Steam
+        self.rarity_cache.preload(stats_games)
+        self.schema_cache.preload(stats_games)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {
+                executor.submit(self.fetch_game_achievements, steam_id, game_id): game_id
+                for game_id in stats_games
+            }
+            try:
+                # Прогресс сообщается из вызывающего потока по мере завершения запросов
+                for future in as_completed(futures):
+                    game_id = futures[future]
+                    try:
+                        results[game_id] = future.result()
+                    except Exception as e:
+                        print(f"Error processing achievements for app {game_id}: {e}")
+                        results[game_id] = None
+
+                    processed += 1
+                    progress(processed, total_games)
+            except BaseException:
+                # При отмене не запускаем оставшиеся запросы
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
+
+    def add_profile(self, steam_id: str, progress: Optional[ProgressCallback] = None) -> bool:
+        """Insert a new profile from its Steam summary and import its whole library"""
+        profile_data = self.api.get_player_summary(steam_id)
+        if not profile_data:
+            print(f"Failed to fetch profile summary for {steam_id}.")
+            return False
+
+        success = self.db.insert_profile(
+            nickname=profile_data.get('personaname', 'Unknown'),
+            steam_id=steam_id,
+            registration_date=datetime.fromtimestamp(profile_data.get('timecreated', 0)),
+            avatar_url=profile_data.get('avatar', '')
+        )
+        if success:
+            success = self.load_games_and_achievements(steam_id, progress)
+        return success
+
+    def refresh_profile(self, steam_id: str, progress: Optional[ProgressCallback] = None) -> bool:
+        """Update profile details and incrementally sync its games"""
+        profile_info = self.api.get_player_summary(steam_id)
+        if not profile_info:
+            print("Failed to fetch updated profile data from Steam API.")
+            return False
+
+        # Update profile data in the database
+        self.db.execute_update(
+            """
+            UPDATE profiles 
+            SET registration_date = %s, avatar_url = %s 
+            WHERE steam_id = %s
+            """,
+            (
+                datetime.fromtimestamp(profile_info.get('timecreated', 0)),
+                profile_info.get('avatar', ''),
+                steam_id
+            ),
+            steam_id=int(steam_id)
+        )
+
+        # Incrementally sync games and achievements
+        self.sync_profile_games(steam_id, progress)
+        return True
+
+    def refresh_all_summaries(self, progress: Optional[ProgressCallback] = None) -> bool:
+        """Refresh nickname, avatar and registration date of every tracked profile in bulk"""
+        steam_ids = self.db.get_profile_steam_ids()
+        summaries = self.api.get_player_summaries(steam_ids)
+        if progress:
+            progress(len(summaries), len(steam_ids))
+
+        rows = [
+            (
+                int(steam_id),
+                profile.get('personaname', 'Unknown'),
+                datetime.fromtimestamp(profile.get('timecreated', 0)),
+                profile.get('avatar', '')
+            )
+            for steam_id, profile in summaries.items()
+        ]
+        print(f"Refreshed summaries for {len(rows)} of {len(steam_ids)} profiles")
+        return self.db.insert_profiles(rows)
+
+    def load_games_and_achievements(self, steam_id: str, progress: Optional[ProgressCallback] = None) -> bool:
+        """Import the whole library, flushing every chunk of games as the response streams in.
+
+        Committed chunks are recorded in import_checkpoints, so an interrupted
+        import resumes from where it stopped instead of starting over.
+        """
+        imported_ids = self.db.get_import_checkpoints(steam_id)
+        if imported_ids:
+            print(f"Resuming import of {steam_id}: {len(imported_ids)} games already imported")
+
+        expected = {}
+        games = self.api.iter_owned_games(steam_id, on_count=lambda count: expected.update(total=count))
+        done = 0
+        complete = True
+        for chunk in chunked(games, self.chunk_size):
+            pending = [game for game in chunk if game['appid'] not in imported_ids]
+            skipped = len(chunk) - len(pending)
+            if pending:
+                if self.import_games(steam_id, pending,
+                                     self.offset_progress(progress, done + skipped, expected),
+                                     fast=self.fast_load):
+                    self.db.add_import_checkpoints(steam_id, [game['appid'] for game in pending])
+                else:
+                    complete = False
+            elif progress:
+                progress(done + skipped, max(expected.get("total", 0), done + skipped))
+            done += len(chunk)
+
+        self.db.refresh_profile_stats(steam_id)
+        if not complete:
+            print(f"Import of {steam_id} finished with errors; run it again to retry the failed games")
+            return False
+        # Импорт завершён полностью - следующий начнётся с нуля
+        self.db.clear_import_checkpoints(steam_id)
+        return True
+
+    def sync_profile_games(self, steam_id: str, progress: Optional[ProgressCallback] = None) -> Optional[int]:
+        """Incrementally refresh a profile, re-fetching only changed or new games.
+
+        Returns the number of changed or removed games, or None if Steam returned nothing.
+        """
+        steam_id_int = int(steam_id)
+        stored = {
+            row['game_id']: row
+            for row in self.db.execute_query(
+                "SELECT game_id, playtime, rtime_last_played FROM profile_games WHERE profile_id = %s",
+                (steam_id_int,)
+            ) or []
+        }
+
+        # Достижения можно получить только играя, поэтому изменения видны по времени в игре
+        def is_changed(game: Dict) -> bool:
+            row = stored.get(game['appid'])
+            return (row is None
+                    or int(row['playtime'] or 0) != game.get('playtime_forever', 0)
+                    or row['rtime_last_played'] != game.get('rtime_last_played', 0))
+
+        def sync_chunk(games: List[Dict], offset: int):
+            # stored - точка отсчёта для приращений времени в игре
+            self.import_games(steam_id, games, self.offset_progress(progress, offset, {}), stored=stored)
+
+        seen = set()
+        changed = 0
+        pending = []
+        written = False
+        try:
+            for game in self.api.iter_owned_games(steam_id):
+                seen.add(game['appid'])
+                if is_changed(game):
+                    pending.append(game)
+                if len(pending) >= self.chunk_size:
+                    written = True
+                    sync_chunk(pending, changed)
+                    changed += len(pending)
+                    pending = []
+            if pending:
+                written = True
+                sync_chunk(pending, changed)
+                changed += len(pending)
+
+            if not seen:
+                # Пустой ответ чаще означает ошибку API или скрытый профиль - ничего не удаляем
+                print(f"No games returned for {steam_id}, skipping sync.")
+                return None
+
+            # Удаляем только после полностью прочитанного ответа
+            removed_ids = list(set(stored) - seen)
+            if removed_ids:
+                written = True
+                self.delete_profile_games(steam_id_int, removed_ids)
+        finally:
+            # Сводка пересчитывается и при обрыве потока: записанные куски уже изменили profile_games,
+            # а следующая синхронизация сочтёт эти игры неизменными
+            if written:
+                self.db.refresh_profile_stats(steam_id)
+
+        self.db.record_sync(steam_id, changed + len(removed_ids))
+
+        print(f"Sync {steam_id}: {changed} changed, {len(removed_ids)} removed, "
+              f"{len(seen) - changed} unchanged")
+        return changed + len(removed_ids)
+
+    @staticmethod
+    def playtime_deltas(games: List[Dict], stored: Dict[int, Dict]) -> List[Tuple[int, int, datetime]]:
+        """(game_id, minutes, played_at) for every game whose playtime_forever grew since the stored value.
+
+        Games without a stored row (new or re-added to the library) only set the
+        baseline: their lifetime playtime would otherwise land in a single day.
+        The increment is dated by rtime_last_played, when it was actually played.
+        """
+        deltas = []
+        for game in games:
+            row = stored.get(game['appid'])
+            if row is None:
+                continue
+            minutes = game.get('playtime_forever', 0) - int(row['playtime'] or 0)
+            if minutes > 0:
+                last_played = game.get('rtime_last_played', 0)
+                deltas.append((game['appid'], minutes,
+                               datetime.fromtimestamp(last_played) if last_played else datetime.now()))
+        return deltas
+
+    def import_games(self, steam_id: str, games: List[Dict], progress: Optional[ProgressCallback] = None,
+                     fast: bool = False, stored: Optional[Dict[int, Dict]] = None) -> bool:
+        """Fetch achievements for the given games and write them; True if every game was fetched and written.
+
+        Games whose achievements could not be fetched are left out entirely, so
+        their stored playtime still differs from Steam and the next sync (or
+        the resumed import) fetches them again.
+
+        fast=True writes the chunk with fast_load_batches (first imports),
+        otherwise every row is upserted in one transaction (incremental syncs).
+        stored is the profile_games state before the sync; playtime growth
+        against it is recorded in the same transaction as the new playtime.
+        """
+        steam_id_int = int(steam_id)
+        with metrics.timer("import_phase_seconds", phase="fetch"):
+            fetched = self.fetch_achievements_concurrently(steam_id, games, progress)
+        failed = {game_id for game_id, result in fetched.items() if result is None}
+        if failed:
+            print(f"Achievements of {len(failed)} games could not be fetched for {steam_id}; they will be retried")
+
+        game_batch = []
+        profile_game_batch = []
+        achievement_batch = []
+        profile_achievement_batch = []
+
+        # Пакеты собираются в исходном порядке игр
+        for game in games:
+            game_id = game['appid']
+            if game_id in failed:
+                continue
+
+            # Добавляем игру в профиль
+            profile_game_batch.append((
+                steam_id_int,
+                game_id,
+                game.get('playtime_forever', 0),
+                game.get('rtime_last_played', 0)
+            ))
+
+            # Добавляем информацию об игре
+            game_batch.append((game_id, game.get('name', 'Unknown'), app_icon_url(game_id, game.get('img_icon_url'))))
+
+            if fetched.get(game_id) is None:
+                continue
+            player_achievements, schema = fetched[game_id]
+
+            # Обрабатываем каждое достижение
+            for ach in player_achievements:
+                apiname = ach.get('apiname')
+                if not apiname:
+                    continue
+
+                # Получаем редкость из кэша; неизвестная редкость хранится как NULL, а не 0%
+                rarity = schema.get(apiname)
+
+                achievement_batch.append((
+                    game_id,
+                    apiname,
+                    rarity  # Добавляем показатель редкости
+                ))
+
+                profile_achievement_batch.append((
+                    game_id,
+                    apiname,
+                    int(ach.get('achieved', 0))
+                ))
+
+        # Пакетная вставка данных
+        with metrics.timer("import_phase_seconds", phase="write"):
+            if fast:
+                success = self.fast_load_batches(steam_id_int, game_batch, profile_game_batch,
+                                                 achievement_batch, profile_achievement_batch)
+            else:
+                written = [game for game in games if game['appid'] not in failed]
+                deltas = self.playtime_deltas(written, stored) if stored else []
+                success = self.upsert_batches(steam_id_int, game_batch, profile_game_batch,
+                                              achievement_batch, profile_achievement_batch, deltas)
+            if success:
+                # Только игры, чьи строки achievements записаны этим куском
+                self.rarity_cache.persist({row[0] for row in achievement_batch})
+                self.schema_cache.persist(fetched)
+            return success and not failed
+
+    def delete_profile_games(self, steam_id: int, game_ids: List[int]):
+        """Remove games (and their unlocked achievements) no longer owned by the profile"""
+        placeholders = ",".join(["%s"] * len(game_ids))
+        self.db.execute_update(
+            f"""DELETE pa FROM profile_achievements pa
+                JOIN achievements a ON a.id = pa.achievement_id
+                WHERE pa.profile_id = %s AND a.game_id IN ({placeholders})""",
+            (steam_id, *game_ids),
+            steam_id=steam_id
+        )
+        self.db.execute_update(
+            f"DELETE FROM profile_games WHERE profile_id = %s AND game_id IN ({placeholders})",
+            (steam_id, *game_ids),
+            steam_id=steam_id
+        )
+
+    def fast_load_batches(self, steam_id: int, game_batch: List[Tuple], profile_game_batch: List[Tuple],
+                          achievement_batch: List[Tuple], profile_achievement_batch: List[Tuple]) -> bool:
+        """Write one import chunk in a single transaction using packet-sized multi-row INSERTs.
+
+        Only rows that already exist (games and achievements shared with other
+        profiles, games left over from an interrupted import) go through upserts.
+        """
+        if not game_batch:
+            return True
+        game_ids = [game[0] for game in game_batch]
+        # Повторы (game_id, apiname) внутри пакета схлопываются, как и при upsert
+        achievements = {(game_id, name): rarity for game_id, name, rarity in achievement_batch}
+        achievement_game_ids = sorted({game_id for game_id, _ in achievements})
+        shared_changed = False
+
+        def placeholders(values: List) -> str:
+            return ",".join(["%s"] * len(values))
+
+        try:
+            with self.db.transaction(tables=("games", "achievements", "profile_games", "profile_achievements"),
+                                     steam_id=steam_id) as cursor:
+                cursor.execute(
+                    f"SELECT app_id, name, icon_url FROM games WHERE app_id IN ({placeholders(game_ids)})",
+                    game_ids
+                )
+                known_games = {row['app_id']: (row['app_id'], row['name'], row['icon_url'])
+                               for row in cursor.fetchall()}
+                new_games = [game for game in game_batch if game[0] not in known_games]
+                if new_games:
+                    self.db.insert_rows(cursor, "games", ("app_id", "name", "icon_url"), new_games)
+                    shared_changed = True
+                renamed = [game for game in game_batch if game[0] in known_games and known_games[game[0]] != game]
+                if renamed:
+                    cursor.executemany(self.GAMES_UPSERT_QUERY, renamed)
+                    shared_changed = True
+
+                cursor.execute(
+                    f"""SELECT game_id FROM profile_games
+                        WHERE profile_id = %s AND game_id IN ({placeholders(game_ids)})""",
+                    (steam_id, *game_ids)
+                )
+                owned = {row['game_id'] for row in cursor.fetchall()}
+                self.db.insert_rows(cursor, "profile_games", ("profile_id", "game_id", "playtime", "rtime_last_played"),
+                                    [row for row in profile_game_batch if row[1] not in owned])
+                if owned:
+                    cursor.executemany(self.PROFILE_GAMES_UPSERT_QUERY,
+                                       [row for row in profile_game_batch if row[1] in owned])
+
+                if achievement_game_ids:
+                    cursor.execute(
+                        f"""SELECT game_id, achievement_name, rarity FROM achievements
+                            WHERE game_id IN ({placeholders(achievement_game_ids)})""",
+                        achievement_game_ids
+                    )
+                    known = {(row['game_id'], row['achievement_name']): row['rarity']
+                             for row in cursor.fetchall()}
+                    # IGNORE: имена, равные существующим с точностью до collation, уже есть в таблице
+                    new_achievements = [(*key, rarity) for key, rarity in achievements.items() if key not in known]
+                    if new_achievements:
+                        self.db.insert_rows(cursor, "achievements", ("game_id", "achievement_name", "rarity"),
+                                            new_achievements, verb="INSERT IGNORE")
+                        shared_changed = True
+                    # Неизвестная редкость (None) не затирает сохранённую
+                    changed = [(*key, rarity) for key, rarity in achievements.items()
+                               if key in known and rarity is not None
+                               and (known[key] is None or round(float(known[key]), 2) != round(rarity, 2))]
+                    if changed:
+                        cursor.executemany(self.ACHIEVEMENTS_UPSERT_QUERY, changed)
+                        shared_changed = True
+
+                if profile_achievement_batch:
+                    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_profile_achievements")
+                    cursor.execute(self.PROFILE_ACHIEVEMENTS_STAGING)
+                    self.db.insert_rows(cursor, "tmp_profile_achievements",
+                                        ("game_id", "achievement_name", "completeness"),
+                                        profile_achievement_batch, verb="INSERT IGNORE")
+                    # Строки могут уже существовать и для новых в profile_games игр
+                    # (например, после прерванного импорта), поэтому upsert нужен всегда
+                    cursor.execute(
+                        self.PROFILE_ACHIEVEMENTS_FROM_STAGING
+                        + " ON DUPLICATE KEY UPDATE completeness = VALUES(completeness)",
+                        (steam_id,)
+                    )
+                    cursor.execute("DROP TEMPORARY TABLE tmp_profile_achievements")
+        except pymysql.Error as e:
+            print(f"Fast load failed: {e}")
+            return False
+
+        if shared_changed:
+            # Изменённые названия и редкость видны в списках игр других профилей
+            self.db.invalidate(("games", "achievements"))
+        return self.db.refresh_profile_game_stats(steam_id, achievement_game_ids)
+
+    GAMES_UPSERT_QUERY = """
+        INSERT INTO games (app_id, name, icon_url)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE name = VALUES(name), icon_url = VALUES(icon_url)
+    """
+    PROFILE_GAMES_UPSERT_QUERY = """
+        INSERT INTO profile_games (profile_id, game_id, playtime, rtime_last_played)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            playtime = VALUES(playtime),
+            rtime_last_played = VALUES(rtime_last_played)
+    """
+    ACHIEVEMENTS_UPSERT_QUERY = """
+        INSERT INTO achievements (game_id, achievement_name, rarity)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE 
+            achievement_name = VALUES(achievement_name),
+            rarity = COALESCE(VALUES(rarity), rarity)
+    """
+    # Временная таблица видна только этому соединению
+    PROFILE_ACHIEVEMENTS_STAGING = """
+        CREATE TEMPORARY TABLE tmp_profile_achievements (
+            game_id int NOT NULL,
+            achievement_name varchar(255) NOT NULL,
+            completeness tinyint NOT NULL,
+            PRIMARY KEY (game_id, achievement_name)
+        )
+    """
+    # Поиск идёт по индексу uniq_achievment (game_id, achievement_name)
+    PROFILE_ACHIEVEMENTS_FROM_STAGING = """
+        INSERT INTO profile_achievements (profile_id, achievement_id, completeness)
+        SELECT %s, a.id, t.completeness
+        FROM tmp_profile_achievements t
+        JOIN achievements a
+            ON a.game_id = t.game_id
+            AND a.achievement_name = t.achievement_name
+    """
+
+    def upsert_batches(self, steam_id: int, game_batch: List[Tuple], profile_game_batch: List[Tuple],
+                       achievement_batch: List[Tuple], profile_achievement_batch: List[Tuple],
+                       playtime_deltas: Optional[List[Tuple[int, int, datetime]]] = None) -> bool:
+        """Upsert one sync chunk in a single transaction.
+
+        profile_games carries the playtime that marks a game as synced, so it
+        is written last and together with the playtime deltas: if anything
+        fails, nothing is committed and the next sync still sees the games as
+        changed and counts their playtime growth then.
+        """
+        if not game_batch:
+            return True
+        try:
+            with self.db.transaction(tables=("games", "achievements", "profile_games", "profile_achievements",
+                                             "playtime_deltas", "playtime_buckets"),
+                                     steam_id=steam_id) as cursor:
+                # Без CLIENT.FOUND_ROWS rowcount учитывает только вставленные и действительно изменённые строки
+                cursor.executemany(self.GAMES_UPSERT_QUERY, game_batch)
+                shared_changed = cursor.rowcount > 0
+                if achievement_batch:
+                    cursor.executemany(self.ACHIEVEMENTS_UPSERT_QUERY, achievement_batch)
+                    shared_changed = shared_changed or cursor.rowcount > 0
+                if profile_achievement_batch:
+                    cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_profile_achievements")
+                    cursor.execute(self.PROFILE_ACHIEVEMENTS_STAGING)
+                    # executemany превращается в многострочные INSERT
+                    metrics.observe("db_batch_rows", len(profile_achievement_batch), SIZE_BUCKETS,
+                                    table="profile_achievements")
+                    cursor.executemany(
+                        """INSERT IGNORE INTO tmp_profile_achievements (game_id, achievement_name, completeness)
+                           VALUES (%s, %s, %s)""",
+                        profile_achievement_batch
+                    )
+                    cursor.execute(
+                        self.PROFILE_ACHIEVEMENTS_FROM_STAGING
+                        + " ON DUPLICATE KEY UPDATE completeness = VALUES(completeness)",
+                        (steam_id,)
+                    )
+                    cursor.execute("DROP TEMPORARY TABLE tmp_profile_achievements")
+                self.db.write_playtime_deltas(cursor, str(steam_id), playtime_deltas or [])
+                cursor.executemany(self.PROFILE_GAMES_UPSERT_QUERY, profile_game_batch)
+        except pymysql.Error as e:
+            print(f"Update failed: {e}")
+            return False
+
+        if shared_changed:
+            # Изменённые названия и редкость видны в списках игр других профилей
+            self.db.invalidate(("games", "achievements"))
+        # Пересчитываем агрегаты только для затронутых игр
+        return self.db.refresh_profile_game_stats(
+            steam_id, sorted({game_id for game_id, _, _ in profile_achievement_batch})
+        )
@@ -0,0 +1,143 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional, Dict, List
+
+# Сколько профилей импортируется одновременно; остальные ждут в очереди
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Минимальный интервал между событиями прогресса одной задачи, секунды
+PROGRESS_INTERVAL = 0.2
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+class Job:
+    """A queued import or refresh of a single profile"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    _ids = itertools.count(1)
+
+    def __init__(self, steam_id: str, kind: str, target: Callable, runner: "JobRunner"):
+        self.id = next(self._ids)
+        self.steam_id = steam_id
+        self.kind = kind
+        self.target = target
+        self.runner = runner
+        self.status = self.QUEUED
+        self.processed = 0
+        self.total = 0
+        self.error: Optional[str] = None
+        self.result = None
+        self.cancel_event = threading.Event()
+        self.last_event = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED, self.CANCELLED)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report(self, processed: int, total: int):
+        """Progress callback passed to the importer; also the cancellation point"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.processed, self.total = processed, total
+        now = time.monotonic()
+        if processed == total or now - self.last_event >= PROGRESS_INTERVAL:
+            self.last_event = now
+            self.runner.emit(self)
+
+
+class JobRunner:
+    """Runs profile jobs on background threads, at most one job per profile"""
+
+    def __init__(self, workers: int = JOB_WORKERS, on_event: Optional[Callable[[Job], None]] = None):
+        self.on_event = on_event
+        self.queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self.active: Dict[str, Job] = {}
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self.worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, steam_id: str, kind: str, target: Callable) -> Optional[Job]:
+        """Queue target(steam_id, progress); returns None if the profile already has a job"""
+        steam_id = str(steam_id)
+        with self.lock:
+            if steam_id in self.active:
+                return None
+            job = Job(steam_id, kind, target, self)
+            self.active[steam_id] = job
+        self.queue.put(job)
+        self.emit(job)
+        return job
+
+    def cancel(self, steam_id: str) -> bool:
+        with self.lock:
+            job = self.active.get(str(steam_id))
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def jobs(self) -> List[Job]:
+        with self.lock:
+            return list(self.active.values())
+
+    def emit(self, job: Job):
+        if self.on_event:
+            try:
+                self.on_event(job)
+            except Exception as e:
+                print(f"Error in job event handler: {e}")
+
+    def worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            self.run(job)
+
+    def run(self, job: Job):
+        if job.cancel_event.is_set():
+            job.status = Job.CANCELLED
+        else:
+            job.status = Job.RUNNING
+            self.emit(job)
+            try:
+                job.result = job.target(job.steam_id, job.report)
+                if job.result is False:
+                    job.status = Job.FAILED
+                else:
+                    job.status = Job.DONE
+            except JobCancelled:
+                job.status = Job.CANCELLED
+            except Exception as e:
+                job.status = Job.FAILED
+                job.error = str(e)
+                print(f"Job {job.kind} for {job.steam_id} failed: {e}")
+
+        with self.lock:
+            self.active.pop(job.steam_id, None)
+        self.emit(job)
+
+    def shutdown(self, cancel: bool = True):
+        """Stop the workers, optionally cancelling queued and running jobs"""
+        if cancel:
+            for job in self.jobs():
+                job.cancel()
+        for _ in self.threads:
+            self.queue.put(None)
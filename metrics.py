@@ -0,0 +1,169 @@
+import atexit
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Dict, List, Tuple
+
+# Сбор метрик выключен по умолчанию; выключенный сбор стоит одну проверку флага
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+# Файл (.prom или .json), куда метрики выгружаются при завершении процесса
+METRICS_FILE = os.getenv("METRICS_FILE")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG_SIZE = 100
+
+# Границы корзин гистограмм: секунды для задержек, штуки для размеров пакетов
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip((*map(str, self.buckets), "+Inf"), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Process-wide counters, histograms and a slow query log"""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, slow_query_ms: float = SLOW_QUERY_MS):
+        self.enabled = enabled
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.slow_queries: "deque[Dict]" = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.slow_queries.clear()
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """Context manager observing the elapsed seconds; a no-op when disabled"""
+        if not self.enabled:
+            return nullcontext()
+        return self._timer(name, labels)
+
+    @contextmanager
+    def _timer(self, name: str, labels: Dict):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_query(self, sql: str, seconds: float, statement: str, rows: Optional[int] = None):
+        """Time a DB statement and keep its text if it was slow"""
+        self.observe("db_query_seconds", seconds, statement=statement)
+        if seconds >= self.slow_query_seconds:
+            text = re.sub(r"\s+", " ", sql).strip()[:1000]
+            entry = {"at": time.time(), "ms": round(seconds * 1000, 1), "rows": rows, "sql": text}
+            with self.lock:
+                self.slow_queries.append(entry)
+            self.increment("db_slow_queries_total", statement=statement)
+            print(f"Slow query ({entry['ms']} ms): {text}")
+
+    def snapshot(self) -> Dict:
+        """JSON-serialisable copy of every series"""
+        with self.lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {"labels": dict(key), "count": h.count, "sum": h.sum, "buckets": dict(h.cumulative())}
+                        for key, h in series.items()
+                    ]
+                    for name, series in self.histograms.items()
+                },
+                "slow_queries": list(self.slow_queries),
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        def render(labels: LabelKey, extra: Tuple = ()) -> str:
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{render(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    lines.extend(f"{name}_bucket{render(key, (('le', bound),))} {count}"
+                                 for bound, count in histogram.cumulative())
+                    lines.append(f"{name}_sum{render(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{render(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Write metrics to a file; .json gets a snapshot, anything else Prometheus text"""
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                if path.endswith(".json"):
+                    json.dump(self.snapshot(), f, indent=2)
+                else:
+                    f.write(self.to_prometheus())
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+
+metrics = Metrics()
+
+if METRICS_ENABLED and METRICS_FILE:
+    atexit.register(metrics.dump, METRICS_FILE)
@@ -0,0 +1,403 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+from io import BytesIO
+from typing import Callable, Iterable, Iterator, Optional, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+# Базовый адрес API можно переопределить, например, для локального тестового сервера
+BASE_URL = os.getenv("STEAM_API_BASE_URL", "https://api.steampowered.com")
+HTTP_TIMEOUT = float(os.getenv("STEAM_HTTP_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("STEAM_HTTP_POOL_SIZE", "16"))
+HTTP_MAX_RETRIES = int(os.getenv("STEAM_HTTP_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("STEAM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("STEAM_BACKOFF_MAX", "30"))
+
+# Квоты Steam Web API: 100 000 запросов в сутки и ограничение на всплески.
+# Суточный лимит считается в пределах одного процесса: UI и sync_daemon с одним
+# ключом расходуют квоту независимо, поэтому её стоит разделить между ними
+DAILY_QUOTA = int(os.getenv("STEAM_DAILY_QUOTA", "100000"))
+BURST_RATE = float(os.getenv("STEAM_BURST_RATE", "10"))
+BURST_CAPACITY = int(os.getenv("STEAM_BURST_CAPACITY", "20"))
+
+# Язык названий и описаний достижений в GetSchemaForGame
+STEAM_LANGUAGE = os.getenv("STEAM_LANGUAGE", "english")
+# GetOwnedGames отдаёт только хэш иконки игры
+APP_ICON_URL = "https://media.steampowered.com/steamcommunity/public/images/apps/{app_id}/{icon_hash}.jpg"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Размер куска при потоковом чтении больших ответов
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def app_icon_url(app_id: int, icon_hash: Optional[str]) -> Optional[str]:
+    """Full icon URL for a GetOwnedGames img_icon_url hash"""
+    return APP_ICON_URL.format(app_id=app_id, icon_hash=icon_hash) if icon_hash else None
+
+
+class TokenBucket:
+    """Token bucket refilled at a constant rate; locking is done by the owner"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Refill and return how many seconds remain until a token is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class DailyCounter:
+    """Fixed-window request counter reset at UTC midnight; locking is done by the owner.
+
+    Unlike a token bucket it never lends unused capacity forward, so a process
+    makes at most `quota` requests per calendar day.
+    """
+
+    def __init__(self, quota: int):
+        self.quota = quota
+        self.day = None
+        self.count = 0
+
+    def wait_time(self) -> float:
+        """Reset on a new day and return how many seconds remain until a request is allowed"""
+        now = datetime.now(timezone.utc)
+        if now.date() != self.day:
+            self.day = now.date()
+            self.count = 0
+        if self.count < self.quota:
+            return 0.0
+        midnight = datetime.combine(self.day + timedelta(days=1), dt_time.min, tzinfo=timezone.utc)
+        return (midnight - now).total_seconds()
+
+    def take(self):
+        self.count += 1
+
+
+class RateLimiter:
+    """Burst token bucket and per-process daily counter plus a shared pause after throttling"""
+
+    def __init__(self, burst_rate: float = BURST_RATE, burst_capacity: int = BURST_CAPACITY,
+                 daily_quota: int = DAILY_QUOTA):
+        self.buckets = [
+            TokenBucket(burst_rate, burst_capacity),
+            DailyCounter(daily_quota),
+        ]
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        """Hold back every caller after the server signalled throttling"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                delay = max(self.blocked_until - time.monotonic(),
+                            *(bucket.wait_time() for bucket in self.buckets))
+                if delay <= 0:
+                    # Токен списывается сразу из всех корзин
+                    for bucket in self.buckets:
+                        bucket.take()
+                    return
+            time.sleep(delay)
+
+
+def iter_json_array(chunks: Iterable[str], key: str,
+                    on_prefix: Optional[Callable[[str], None]] = None) -> Iterator[Dict]:
+    """Incrementally yield the items of the first JSON array stored under `key`.
+
+    Only the current item is held in memory, so very large responses can be
+    processed while they are still being downloaded. An item is yielded only
+    once the following `,` or `]` has arrived, so scalars cut at a chunk
+    boundary are not decoded early. on_prefix receives the text preceding the
+    array (e.g. to read a count field).
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer = ""
+
+    while (match := start.search(buffer)) is None:
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        buffer += chunk
+    if on_prefix:
+        on_prefix(buffer[:match.start()])
+    buffer = buffer[match.end():]
+
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if not buffer:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError(f"Unterminated JSON array '{key}'")
+            buffer = chunk
+            continue
+        if buffer[0] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Элемент ещё не дочитан - подгружаем следующий кусок
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise
+            buffer += chunk
+            continue
+        rest = buffer[end:].lstrip(" \t\r\n")
+        if not rest or rest[0] not in ",]":
+            # Число или литерал мог оборваться на границе куска ("9." + "5") - ждём разделитель
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError(f"Malformed JSON array '{key}'")
+            buffer += chunk
+            continue
+        yield item
+        buffer = rest
+
+
+def create_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """Create a keep-alive session shared by all endpoints"""
+    session = requests.Session()
+    # Повторы выполняются вручную, чтобы учитывать Retry-After и общий лимитер
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SteamAPIManager:
+    BASE_URL = BASE_URL
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 session: Optional[requests.Session] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 timeout: float = HTTP_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
+        self.session = session or create_session()
+        self.limiter = limiter or RateLimiter()
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Retry-After from the server, otherwise full-jitter exponential backoff"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, url: str, params: Dict = None, limited: bool = True,
+                timeout: Optional[float] = None, headers: Optional[Dict] = None,
+                stream: bool = False) -> requests.Response:
+        """GET with pooling, timeout, quota limiting and retries on 429/5xx"""
+        if not metrics.enabled:
+            return self._request(url, params, limited, timeout, headers, stream, None)
+        # Аватары с CDN учитываются одной меткой, чтобы не плодить серии по URL
+        endpoint = urlsplit(url).path if limited else "avatar"
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = self._request(url, params, limited, timeout, headers, stream, endpoint)
+            status = str(response.status_code)
+            return response
+        except requests.HTTPError as e:
+            status = str(e.response.status_code) if e.response is not None else status
+            raise
+        finally:
+            metrics.observe("steam_api_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+            metrics.increment("steam_api_requests_total", endpoint=endpoint, status=status)
+
+    def _request(self, url: str, params: Optional[Dict], limited: bool, timeout: Optional[float],
+                 headers: Optional[Dict], stream: bool, endpoint: Optional[str]) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                with metrics.timer("steam_api_limiter_wait_seconds"):
+                    self.limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, headers=headers, stream=stream,
+                                            timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                metrics.increment("steam_api_retries_total", endpoint=endpoint, reason="connection")
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self.backoff_delay(attempt, response)
+                metrics.increment("steam_api_retries_total", endpoint=endpoint, reason=str(response.status_code))
+                if response.status_code == 429 and limited:
+                    self.limiter.pause(delay)
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+    SUMMARIES_BATCH_SIZE = 100  # GetPlayerSummaries принимает до 100 steamid за запрос
+
+    def get_player_summary(self, steam_id: str) -> Optional[Dict]:
+        try:
+            steam_id_int = int(steam_id)
+        except ValueError:
+            return None
+
+        return self.get_player_summaries([steam_id_int]).get(str(steam_id_int))
+
+    def get_player_summaries(self, steam_ids: List) -> Dict[str, Dict]:
+        """Fetch summaries for many profiles, 100 ids per request, keyed by steam_id"""
+        ids = []
+        for steam_id in steam_ids:
+            try:
+                ids.append(str(int(steam_id)))
+            except ValueError:
+                continue
+
+        endpoint = f"{self.base_url}/ISteamUser/GetPlayerSummaries/v2/"
+        summaries = {}
+        for i in range(0, len(ids), self.SUMMARIES_BATCH_SIZE):
+            chunk = ids[i:i + self.SUMMARIES_BATCH_SIZE]
+            params = {"key": self.api_key, "steamids": ",".join(chunk)}
+            try:
+                data = self.request(endpoint, params).json()
+                for player in data.get('response', {}).get('players', []):
+                    summaries[str(player.get('steamid'))] = player
+            except Exception as e:
+                print(f"Error getting player summaries: {e}")
+        return summaries
+
+    def get_owned_games(self, steam_id: str) -> List[Dict]:
+        try:
+            return list(self.iter_owned_games(steam_id))
+        except Exception as e:
+            print(f"Error getting owned games: {e}")
+            return []
+
+    def iter_owned_games(self, steam_id: str,
+                         on_count: Optional[Callable[[int], None]] = None) -> Iterator[Dict]:
+        """Stream owned games one by one while the response is downloaded.
+
+        on_count receives game_count as soon as it is parsed. Errors are raised
+        to the caller, which can keep whatever it already processed.
+        """
+        endpoint = f"{self.base_url}/IPlayerService/GetOwnedGames/v1/"
+        params = {
+            "key": self.api_key,
+            "steamid": steam_id,
+            "include_appinfo": True,
+            "include_played_free_games": True
+        }
+
+        def read_count(prefix: str):
+            if on_count and (match := re.search(r'"game_count"\s*:\s*(\d+)', prefix)):
+                on_count(int(match.group(1)))
+
+        with self.request(endpoint, params, stream=True) as response:
+            response.encoding = response.encoding or "utf-8"
+            yield from iter_json_array(
+                response.iter_content(chunk_size=STREAM_CHUNK_SIZE, decode_unicode=True),
+                "games",
+                on_prefix=read_count
+            )
+
+    def get_player_achievements(self, steam_id: str, app_id: int) -> Optional[List[Dict]]:
+        """Player's achievements for an app; [] if the app has no stats, None if the request failed"""
+        endpoint = f"{self.base_url}/ISteamUserStats/GetPlayerAchievements/v1/"
+        params = {"key": self.api_key, "steamid": steam_id, "appid": app_id}
+        try:
+            return self.request(endpoint, params).json().get('playerstats', {}).get('achievements', [])
+        except requests.HTTPError as e:
+            # 400 - окончательный ответ ("Requested app has no stats"), а не сбой
+            if e.response is not None and e.response.status_code == 400:
+                return []
+            print(f"Error getting achievements for app {app_id}: {e}")
+            return None
+        except Exception as e:
+            print(f"Error getting achievements for app {app_id}: {e}")
+            return None
+
+    def get_achievement_schema(self, app_id: int) -> Optional[Dict[str, float]]:
+        """Global achievement percentages for an app, or None if the request failed"""
+        endpoint = f"{self.base_url}/ISteamUserStats/GetGlobalAchievementPercentagesForApp/v2/"
+        params = {"gameid": app_id}  # Используем правильный параметр gameid вместо appid
+
+        try:
+            data = self.request(endpoint, params).json()
+
+            # Правильный путь к данным в ответе API
+            achievements = data.get('achievementpercentages', {}).get('achievements', [])
+
+            return {ach['name']: ach.get('percent', 0.0) for ach in achievements}
+
+        except Exception as e:
+            print(f"Error getting schema for app {app_id}: {e}")
+            return None
+
+    def get_game_schema(self, app_id: int) -> Optional[List[Dict]]:
+        """Achievement display names, descriptions and icon URLs for an app, or None if the request failed"""
+        endpoint = f"{self.base_url}/ISteamUserStats/GetSchemaForGame/v2/"
+        params = {"key": self.api_key, "appid": app_id, "l": STEAM_LANGUAGE}
+
+        try:
+            data = self.request(endpoint, params).json()
+            return data.get('game', {}).get('availableGameStats', {}).get('achievements', [])
+        except Exception as e:
+            print(f"Error getting game schema for app {app_id}: {e}")
+            return None
+
+    def get_avatar_image(self, url: str) -> Optional[bytes]:
+        result = self.fetch_avatar(url)
+        return result[0] if result else None
+
+    def fetch_avatar(self, url: str, etag: Optional[str] = None,
+                     last_modified: Optional[str] = None) -> Optional[Tuple[Optional[bytes], Dict]]:
+        """Download an avatar as a PNG thumbnail, conditionally if validators are given.
+
+        Returns (png, validators); png is None when the server answered 304 Not Modified.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            # Аватары отдаются CDN и не расходуют квоту Web API
+            response = self.request(url, limited=False, headers=headers)
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            if response.status_code == 304:
+                return None, validators
+            # PIL нужен только при первой загрузке аватара
+            from PIL import Image
+            with Image.open(BytesIO(response.content)) as img:
+                img.thumbnail((100, 100))
+                buffer = BytesIO()
+                img.save(buffer, format="PNG")
+                return buffer.getvalue(), validators
+        except Exception as e:
+            print(f"Error downloading avatar: {e}")
+            return None
@@ -28,12 +28,15 @@ CREATE TABLE `achievements` (
   `id` int NOT NULL AUTO_INCREMENT,
   `game_id` int NOT NULL,
   `achievement_name` varchar(255) NOT NULL,
-  `rarity` decimal(5,2) NOT NULL DEFAULT '100.00',
+  `rarity` decimal(5,2) DEFAULT NULL,
+  `display_name` varchar(255) DEFAULT NULL,
+  `description` varchar(1024) DEFAULT NULL,
   `icon` varchar(255) DEFAULT NULL,
   `icon_gray` varchar(255) DEFAULT NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `uniq_achievment` (`game_id`,`achievement_name`),
-  KEY `game_achievement_idx` (`game_id`) /*!80000 INVISIBLE */,
+  KEY `game_achievement_idx` (`game_id`),
+  KEY `rarity_idx` (`rarity`),
   CONSTRAINT `game_achievement` FOREIGN KEY (`game_id`) REFERENCES `games` (`app_id`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=70790 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -54,6 +57,78 @@ CREATE TABLE `games` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `import_checkpoints`
+--
+
+DROP TABLE IF EXISTS `import_checkpoints`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `import_checkpoints` (
+  `profile_id` bigint NOT NULL,
+  `app_id` int NOT NULL,
+  `imported_at` datetime NOT NULL,
+  PRIMARY KEY (`profile_id`,`app_id`),
+  CONSTRAINT `import_checkpoint_profile` FOREIGN KEY (`profile_id`) REFERENCES `profiles` (`steam_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `leaderboard_ranks`
+--
+
+DROP TABLE IF EXISTS `leaderboard_ranks`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `leaderboard_ranks` (
+  `metric` varchar(32) NOT NULL,
+  `profile_id` bigint NOT NULL,
+  `position` int NOT NULL,
+  `value` decimal(12,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`metric`,`profile_id`),
+  KEY `metric_position_idx` (`metric`,`position`,`value`),
+  KEY `leaderboard_rank_profile_idx` (`profile_id`),
+  CONSTRAINT `leaderboard_rank_profile` FOREIGN KEY (`profile_id`) REFERENCES `profiles` (`steam_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `playtime_buckets`
+--
+
+DROP TABLE IF EXISTS `playtime_buckets`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `playtime_buckets` (
+  `profile_id` bigint NOT NULL,
+  `period` enum('day','week') NOT NULL,
+  `bucket_start` date NOT NULL,
+  `game_id` int NOT NULL,
+  `minutes` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`profile_id`,`period`,`bucket_start`,`game_id`),
+  CONSTRAINT `playtime_bucket_profile` FOREIGN KEY (`profile_id`) REFERENCES `profiles` (`steam_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `playtime_deltas`
+--
+
+DROP TABLE IF EXISTS `playtime_deltas`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `playtime_deltas` (
+  `profile_id` bigint NOT NULL,
+  `recorded_at` datetime NOT NULL,
+  `game_id` int NOT NULL,
+  `minutes` mediumint NOT NULL,
+  PRIMARY KEY (`profile_id`,`recorded_at`,`game_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+/*!50500 PARTITION BY RANGE  COLUMNS(recorded_at)
+(PARTITION p202610 VALUES LESS THAN ('2026-11-01') ENGINE = InnoDB,
+ PARTITION p_future VALUES LESS THAN (MAXVALUE) ENGINE = InnoDB) */;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `profile_achievements`
 --
@@ -67,12 +142,32 @@ CREATE TABLE `profile_achievements` (
   `completeness` tinyint DEFAULT '0',
   PRIMARY KEY (`profile_id`,`achievement_id`),
   UNIQUE KEY `profile_id_UNIQUE` (`profile_id`,`achievement_id`),
-  KEY `achievement_id` (`achievement_id`),
+  KEY `achievement_unlocks_idx` (`achievement_id`,`completeness`),
   CONSTRAINT `profile_achievement` FOREIGN KEY (`profile_id`) REFERENCES `profiles` (`steam_id`) ON DELETE CASCADE ON UPDATE CASCADE,
   CONSTRAINT `profile_achievements_ibfk_2` FOREIGN KEY (`achievement_id`) REFERENCES `achievements` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `profile_game_stats`
+--
+
+DROP TABLE IF EXISTS `profile_game_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `profile_game_stats` (
+  `profile_id` bigint NOT NULL,
+  `game_id` int NOT NULL,
+  `total_achievements` int NOT NULL DEFAULT '0',
+  `unlocked_achievements` int NOT NULL DEFAULT '0',
+  `completion_percent` decimal(5,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`profile_id`,`game_id`),
+  KEY `profile_completion_idx` (`profile_id`,`completion_percent`),
+  KEY `game_completion_idx` (`game_id`,`completion_percent`),
+  CONSTRAINT `profile_game_stats_game` FOREIGN KEY (`profile_id`, `game_id`) REFERENCES `profile_games` (`profile_id`, `game_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `profile_games`
 --
@@ -84,6 +179,7 @@ CREATE TABLE `profile_games` (
   `profile_id` bigint NOT NULL,
   `game_id` int NOT NULL,
   `playtime` decimal(8,2) DEFAULT '0.00',
+  `rtime_last_played` int unsigned NOT NULL DEFAULT '0',
   PRIMARY KEY (`profile_id`,`game_id`),
   KEY `game_profile_idx` (`game_id`),
   CONSTRAINT `game_profile` FOREIGN KEY (`game_id`) REFERENCES `games` (`app_id`) ON DELETE CASCADE ON UPDATE CASCADE,
@@ -91,6 +187,43 @@ CREATE TABLE `profile_games` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `profile_stats`
+--
+
+DROP TABLE IF EXISTS `profile_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `profile_stats` (
+  `profile_id` bigint NOT NULL,
+  `total_achievements` int NOT NULL DEFAULT '0',
+  `total_games` int NOT NULL DEFAULT '0',
+  `completed_games` int NOT NULL DEFAULT '0',
+  `total_playtime_hours` decimal(12,2) NOT NULL DEFAULT '0.00',
+  `rare_achievements` int NOT NULL DEFAULT '0',
+  `avg_achievement_completion` decimal(5,2) NOT NULL DEFAULT '0.00',
+  `updated_at` datetime NOT NULL,
+  PRIMARY KEY (`profile_id`),
+  CONSTRAINT `profile_stats_profile` FOREIGN KEY (`profile_id`) REFERENCES `profiles` (`steam_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `profile_sync_state`
+--
+
+DROP TABLE IF EXISTS `profile_sync_state`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `profile_sync_state` (
+  `profile_id` bigint NOT NULL,
+  `last_synced_at` datetime NOT NULL,
+  `last_changed_games` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`profile_id`),
+  CONSTRAINT `profile_sync_state_profile` FOREIGN KEY (`profile_id`) REFERENCES `profiles` (`steam_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `profiles`
 --
@@ -106,6 +239,37 @@ CREATE TABLE `profiles` (
   PRIMARY KEY (`steam_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `rarity_cache`
+--
+
+DROP TABLE IF EXISTS `rarity_cache`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `rarity_cache` (
+  `app_id` int NOT NULL,
+  `refreshed_at` datetime NOT NULL,
+  PRIMARY KEY (`app_id`),
+  CONSTRAINT `rarity_cache_game` FOREIGN KEY (`app_id`) REFERENCES `games` (`app_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `schema_cache`
+--
+
+DROP TABLE IF EXISTS `schema_cache`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `schema_cache` (
+  `app_id` int NOT NULL,
+  `achievement_count` int NOT NULL,
+  `fetched_at` datetime NOT NULL,
+  PRIMARY KEY (`app_id`),
+  CONSTRAINT `schema_cache_game` FOREIGN KEY (`app_id`) REFERENCES `games` (`app_id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
 /*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
 
 /*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
@@ -0,0 +1,225 @@
+"""Headless scheduled sync of all tracked profiles (no Flet required).
+
+    python sync_daemon.py [--workers N] [--interval MINUTES] [--once] [--metrics-file metrics.prom]
+"""
+import argparse
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения до импорта модулей, читающих их при загрузке
+load_dotenv()
+
+from db import DBManager
+from importer import ProfileImporter
+from jobs import Job, JobRunner
+from metrics import metrics
+from steam_api import SteamAPIManager
+
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "4"))
+# Базовый интервал обновления неактивного профиля
+SYNC_INTERVAL_MINUTES = float(os.getenv("SYNC_INTERVAL_MINUTES", "360"))
+# Как часто перечитывать список профилей и обновлять ник/аватар пачками
+SYNC_RESCAN_MINUTES = float(os.getenv("SYNC_RESCAN_MINUTES", "10"))
+SYNC_SUMMARY_MINUTES = float(os.getenv("SYNC_SUMMARY_MINUTES", "1440"))
+# Во сколько раз чаще обновляются профили, где в прошлый раз были изменения
+MAX_ACTIVITY_BOOST = 4
+
+
+class SyncDaemon:
+    """Keeps every profile fresh: the stalest and most active profiles are synced first.
+
+    Profiles wait in a heap ordered by due time; due times shrink for profiles
+    whose last sync found changes. Syncs run on a JobRunner worker pool and share
+    the API manager's rate limiter, so the pool never exceeds the Steam quota.
+    """
+
+    def __init__(self, api: SteamAPIManager, db: DBManager, workers: int = SYNC_WORKERS,
+                 interval_minutes: float = SYNC_INTERVAL_MINUTES,
+                 importer: Optional[ProfileImporter] = None):
+        self.db = db
+        self.importer = importer or ProfileImporter(api, db)
+        self.workers = workers
+        self.interval = interval_minutes * 60
+        self.heap: List[Tuple[float, str]] = []
+        self.due: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.idle = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.runner: Optional[JobRunner] = None
+        self.started_at: Optional[datetime] = None
+        self.counters = {"synced": 0, "failed": 0, "changed_games": 0}
+
+    def next_due(self, last_synced: Optional[float], changed_games: int) -> float:
+        if last_synced is None:
+            return 0.0  # Ни разу не синхронизированные профили идут первыми
+        boost = 1 + min(changed_games, MAX_ACTIVITY_BOOST - 1)
+        return last_synced + self.interval / boost
+
+    def schedule(self, steam_id: str, due: float):
+        with self.lock:
+            self.due[steam_id] = due
+            heapq.heappush(self.heap, (due, steam_id))
+        self.wakeup.set()
+
+    def rescan(self):
+        """Pick up profiles added since the last scan"""
+        running = {job.steam_id for job in self.runner.jobs()}
+        for row in self.db.get_sync_candidates():
+            steam_id = str(row['steam_id'])
+            if steam_id in self.due or steam_id in running:
+                continue
+            last_synced = row['last_synced_at'].timestamp() if row['last_synced_at'] else None
+            self.schedule(steam_id, self.next_due(last_synced, row['last_changed_games']))
+
+    def dispatch(self):
+        """Hand due profiles to the worker pool without queueing more than it can run"""
+        now = time.time()
+        while len(self.runner.jobs()) < self.workers:
+            with self.lock:
+                if not self.heap or self.heap[0][0] > now:
+                    return
+                due, steam_id = heapq.heappop(self.heap)
+                # Устаревшая запись кучи - профиль уже перепланирован
+                if self.due.get(steam_id) != due:
+                    continue
+                del self.due[steam_id]
+            self.runner.submit(steam_id, "sync", self.importer.sync_profile_games)
+
+    def on_job_event(self, job: Job):
+        if not job.finished or job.kind != "sync":
+            return
+        if job.status == Job.DONE:
+            changed = job.result or 0
+            with self.lock:
+                self.counters["synced"] += 1
+                self.counters["changed_games"] += changed
+            self.schedule(job.steam_id, self.next_due(time.time(), changed))
+        elif job.status == Job.FAILED:
+            with self.lock:
+                self.counters["failed"] += 1
+            # Ошибка (например, 429) - повторяем раньше обычного
+            self.schedule(job.steam_id, time.time() + self.interval / MAX_ACTIVITY_BOOST)
+        self.wakeup.set()
+
+    def run(self):
+        next_rescan = 0.0
+        next_summary = time.time() + SYNC_SUMMARY_MINUTES * 60
+        while not self.stop_event.is_set():
+            now = time.time()
+            if now >= next_rescan:
+                self.rescan()
+                # Места пересчитываются, только если с прошлого прохода изменилась profile_stats
+                self.db.refresh_leaderboards()
+                # Разделы истории времени в игре создаются заранее, устаревшие удаляются
+                self.db.maintain_playtime_partitions()
+                next_rescan = now + SYNC_RESCAN_MINUTES * 60
+            if now >= next_summary:
+                self.runner.submit("all", "summaries",
+                                   lambda _, progress: self.importer.refresh_all_summaries(progress))
+                next_summary = now + SYNC_SUMMARY_MINUTES * 60
+
+            self.dispatch()
+
+            with self.lock:
+                next_due = self.heap[0][0] if self.heap else now + 60
+                overdue = any(due <= now for due in self.due.values())
+            if not overdue and not self.runner.jobs():
+                self.idle.set()
+            else:
+                self.idle.clear()
+            self.wakeup.wait(max(0.5, min(next_due, next_rescan, next_summary) - now))
+            self.wakeup.clear()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.runner = JobRunner(workers=self.workers, on_event=self.on_job_event)
+        self.started_at = datetime.now()
+        self.thread = threading.Thread(target=self.run, name="sync-scheduler", daemon=True)
+        self.thread.start()
+        print(f"Sync daemon started with {self.workers} workers")
+
+    def stop(self):
+        """Stop scheduling and cancel running syncs; they continue incrementally next time"""
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+        if self.runner:
+            self.runner.shutdown(cancel=True)
+        print("Sync daemon stopped")
+
+    def sync_all_now(self):
+        """Make every known profile due immediately"""
+        for row in self.db.get_sync_candidates():
+            self.schedule(str(row['steam_id']), 0.0)
+
+    def status(self) -> Dict:
+        with self.lock:
+            now = time.time()
+            queued = len(self.due)
+            overdue = sum(1 for due in self.due.values() if due <= now)
+            counters = dict(self.counters)
+        return {
+            "running": bool(self.thread and self.thread.is_alive()),
+            "started_at": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "workers": self.workers,
+            "queued": queued,
+            "due_now": overdue,
+            "active": [
+                {"steam_id": job.steam_id, "kind": job.kind, "processed": job.processed, "total": job.total}
+                for job in (self.runner.jobs() if self.runner else [])
+            ],
+            **counters,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep all tracked Steam profiles in sync without the UI")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS, help="profiles synced in parallel")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL_MINUTES,
+                        help="base refresh interval for inactive profiles, minutes")
+    parser.add_argument("--once", action="store_true", help="sync every profile once and exit")
+    parser.add_argument("--status-every", type=float, default=60, help="print status every N seconds")
+    parser.add_argument("--metrics-file", help="enable metrics and rewrite this .prom/.json file with each status")
+    args = parser.parse_args()
+
+    if args.metrics_file:
+        metrics.enable()
+
+    daemon = SyncDaemon(SteamAPIManager(os.getenv("STEAM_API_KEY")), DBManager(),
+                        workers=args.workers, interval_minutes=args.interval)
+    if args.once:
+        daemon.sync_all_now()
+    daemon.start()
+    try:
+        while True:
+            if args.once:
+                # Выходим, когда все профили синхронизированы и очередь пуста
+                if daemon.idle.wait(args.status_every):
+                    break
+            else:
+                time.sleep(args.status_every)
+            print("Sync status:", daemon.status())
+            if args.metrics_file:
+                metrics.dump(args.metrics_file)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Sync status:", daemon.status())
+        daemon.stop()
+        if args.metrics_file:
+            metrics.dump(args.metrics_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,342 +1,113 @@
-import requests
 import flet as ft
-import pymysql
-import base64
-from pymysql.constants import CLIENT
-from datetime import datetime
-from PIL import Image
-from io import BytesIO
-from typing import Optional, Dict, List, Tuple
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
 load_dotenv()
 
+# requests, pymysql и PIL загружаются в фоне уже после показа окна (см. start_backend)
+from jobs import Job, JobRunner
+
 # Заменяем статические значения на переменные окружения
 API_KEY = os.getenv("STEAM_API_KEY")
 
 colors = ft.Colors
 BorderSide = ft.border.BorderSide
 
-class SteamAPIManager:
-    BASE_URL = "https://api.steampowered.com"
-
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-
-    def get_player_summary(self, steam_id: str) -> Optional[Dict]:
-        try:
-            steam_id_int = int(steam_id)
-        except ValueError:
-            return None
-
-        params = {"key": self.api_key, "steamids": steam_id_int}
-        endpoint = f"{self.BASE_URL}/ISteamUser/GetPlayerSummaries/v2/"
-
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return data.get('response', {}).get('players', [{}])[0]
-        except Exception as e:
-            print(f"Error getting player summary: {e}")
-            return None
-
-    def get_owned_games(self, steam_id: str) -> List[Dict]:
-        endpoint = f"{self.BASE_URL}/IPlayerService/GetOwnedGames/v1/"
-        params = {
-            "key": self.api_key,
-            "steamid": steam_id,
-            "include_appinfo": True,
-            "include_played_free_games": True
-        }
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            return response.json().get('response', {}).get('games', [])
-        except Exception as e:
-            print(f"Error getting owned games: {e}")
-            return []
-
-    def get_player_achievements(self, steam_id: str, app_id: int) -> List[Dict]:
-        endpoint = f"{self.BASE_URL}/ISteamUserStats/GetPlayerAchievements/v1/"
-        params = {"key": self.api_key, "steamid": steam_id, "appid": app_id}
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            return response.json().get('playerstats', {}).get('achievements', [])
-        except Exception as e:
-            print(f"Error getting achievements for app {app_id}: {e}")
-            return []
-
-    def get_achievement_schema(self, app_id: int) -> Dict[str, float]:
-        endpoint = f"{self.BASE_URL}/ISteamUserStats/GetGlobalAchievementPercentagesForApp/v2/"
-        params = {"gameid": app_id}  # Используем правильный параметр gameid вместо appid
-
-        try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            # Правильный путь к данным в ответе API
-            achievements = data.get('achievementpercentages', {}).get('achievements', [])
-
-            return {ach['name']: ach.get('percent', 0.0) for ach in achievements}
-
-        except Exception as e:
-            print(f"Error getting schema for app {app_id}: {e}")
-            return {}
-
-    def get_avatar_image(self, url: str) -> Optional[bytes]:
-        try:
-            response = requests.get(url, stream=True, timeout=10)
-            response.raise_for_status()
-            with Image.open(BytesIO(response.content)) as img:
-                img.thumbnail((100, 100))
-                buffer = BytesIO()
-                img.save(buffer, format="PNG")
-                return buffer.getvalue()
-        except Exception as e:
-            print(f"Error downloading avatar: {e}")
-            return None
-
-class DBManager:
-    def __init__(self):
-        self.connection = None
-        self.connect()
-
-    def connect(self):
-        try:
-            self.connection = pymysql.connect(
-                host="localhost",
-                user="root",
-                password="123456fF",
-                database="acch",
-                client_flag=CLIENT.MULTI_STATEMENTS,
-                cursorclass=pymysql.cursors.DictCursor,
-                autocommit=True
-            )
-            print("Database connection established")
-        except pymysql.Error as e:
-            print(f"Database connection failed: {e}")
-            raise
-
-    def execute_query(self, query: str, params: Tuple = None) -> Optional[List[Dict]]:
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(query, params or ())
-                return cursor.fetchall()
-        except pymysql.Error as e:
-            print(f"Query execution failed: {e}")
-            return None
-
-    def execute_update(self, query: str, params=None, many=False) -> bool:
-        try:
-            with self.connection.cursor() as cursor:
-                if many:
-                    cursor.executemany(query, params)
-                else:
-                    cursor.execute(query, params)
-                self.connection.commit()
-                return True
-        except pymysql.Error as e:
-            self.connection.rollback()
-            print(f"Update failed: {e}")
-            return False
-
-    def reconnect(self):
-        """Reconnect to the database"""
-        self.disconnect()
-        self.connect()
-
-    def disconnect(self):
-        """Close database connection"""
-        if self.connection:
-            try:
-                self.connection.close()
-                print("Database connection closed")
-            except Exception as e:
-                print(f"Error closing connection: {e}")
-            finally:
-                self.connection = None
-                self.cursor = None
-
-    # Profile-related operations
-    def get_profile_statistics(self, steam_id: str) -> Optional[Dict]:
-        try:
-            steam_id_int = int(steam_id)
-        except ValueError:
-            return None
-        query = """
-            WITH profile_stats AS (
-                SELECT 
-                    p.steam_id,
-                    p.nickname,
-                    p.registration_date,
-                    p.avatar_url,
-
-                    -- Total Achievements
-                    (SELECT COALESCE(COUNT(*), 0)
-                     FROM profile_achievements pa
-                     WHERE pa.profile_id = p.steam_id 
-                       AND pa.completeness = 1) AS total_achievements,
-
-                    -- Total Games
-                    (SELECT COALESCE(COUNT(*), 0)
-                     FROM profile_games pg
-                     WHERE pg.profile_id = p.steam_id) AS total_games,
-
-                    -- Completed Games
-                    (SELECT COALESCE(COUNT(DISTINCT a.game_id), 0)
-                     FROM profile_achievements pa
-                     JOIN achievements a ON pa.achievement_id = a.id
-                     WHERE pa.profile_id = p.steam_id
-                       AND pa.completeness = 1
-                       AND NOT EXISTS (
-                           SELECT 1 
-                           FROM achievements a2
-                           WHERE a2.game_id = a.game_id
-                             AND NOT EXISTS (
-                                 SELECT 1 
-                                 FROM profile_achievements pa2
-                                 WHERE pa2.achievement_id = a2.id
-                                   AND pa2.profile_id = p.steam_id
-                                   AND pa2.completeness = 1
-                             )
-                       )) AS completed_games,
-
-                    -- Total Playtime
-                    (SELECT COALESCE(SUM(pg.playtime), 0) / 60 
-                     FROM profile_games pg
-                     WHERE pg.profile_id = p.steam_id) AS total_playtime_hours,
-
-                    -- Rare Achievements
-                    (SELECT COALESCE(COUNT(*), 0)
-                     FROM profile_achievements pa
-                     JOIN achievements a ON pa.achievement_id = a.id
-                     WHERE pa.profile_id = p.steam_id
-                       AND pa.completeness = 1
-                       AND a.rarity < 10) AS rare_achievements,
-
-                    -- Average Completion
-                    (SELECT COALESCE(AVG(pa.completeness * 100), 0)
-                     FROM profile_achievements pa
-                     JOIN achievements a ON pa.achievement_id = a.id
-                     WHERE pa.profile_id = p.steam_id) AS avg_achievement_completion
-
-                FROM profiles p
-                WHERE p.steam_id = %s
-            )
-            SELECT * FROM profile_stats;
-        """
-        return self.execute_query(query, (steam_id_int,))
-
-    def insert_profile(self, nickname: str, steam_id: str,
-                       registration_date: datetime, avatar_url: str) -> bool:
-        try:
-            steam_id_int = int(steam_id)
-        except ValueError:
-            return False
-
-        query = """
-            INSERT INTO profiles (steam_id, nickname, registration_date, avatar_url)
-            VALUES (%s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-                nickname = VALUES(nickname),
-                registration_date = VALUES(registration_date),
-                avatar_url = VALUES(avatar_url)
-        """
-        return self.execute_update(query, (steam_id_int, nickname, registration_date, avatar_url))
-
-    def get_profile_games(self, steam_id: str) -> List[Dict]:
-        """Get games with completion stats for a profile using steam_id"""
-        query = """
-            SELECT 
-                g.name,
-                COUNT(a.id) AS total_achievements,
-                COALESCE(SUM(pa.completeness), 0) AS completed_achievements,
-                CASE 
-                    WHEN COUNT(a.id) > 0 
-                    THEN ROUND(SUM(pa.completeness) * 100.0 / COUNT(a.id), 2) 
-                    ELSE 0 
-                END AS completion_percent
-            FROM profile_games pg
-            JOIN games g ON pg.game_id = g.app_id
-            LEFT JOIN achievements a ON g.app_id = a.game_id
-            LEFT JOIN profile_achievements pa 
-                ON a.id = pa.achievement_id 
-                AND pa.profile_id = pg.profile_id
-            WHERE pg.profile_id = %s
-            GROUP BY g.name
-            ORDER BY g.name
-        """
-        return self.execute_query(query, (steam_id,))
-
-    def get_profile_id_by_steam_id(self, steam_id: str) -> Optional[int]:
-        """Get profile ID by steam_id"""
-        query = """
-            SELECT id FROM profiles WHERE steam_id = %s
-        """
-        result = self.execute_query(query, (steam_id,))
-        return result[0]['id'] if result else None
-
-    def get_profile_nickname_by_steam_id(self, steam_id: str) -> Optional[str]:
-        """Get profile nickname by steam_id"""
-        query = """
-            SELECT nickname FROM profiles WHERE steam_id = %s
-        """
-        result = self.execute_query(query, (steam_id,))
-        return result[0].get('nickname') if result else None
-
-
 class SteamStatsApp:
     """Main application controller with UI management"""
 
+    GAMES_PAGE_SIZE = 50
+    # Заголовки столбцов списка игр и соответствующие ключи сортировки в БД
+    GAMES_COLUMNS = [
+        ("Игра", "name"),
+        ("Достижений", "total_achievements"),
+        ("Получено", "completed_achievements"),
+        ("Завершенность %", "completion_percent"),
+    ]
+    LEADERBOARD_SIZE = 50
+    ACTIVITY_WEEKS = 12
+    # Ключи совпадают с DBManager.LEADERBOARD_METRICS; "rarest" - редчайшие полученные достижения
+    LEADERBOARD_VIEWS = {
+        "completed_games": "Завершенные игры",
+        "total_achievements": "Достижения",
+        "rare_achievements": "Редкие достижения",
+        "avg_achievement_completion": "Средний прогресс %",
+        "total_playtime_hours": "Часы в играх",
+        "rarest": "Редчайшие достижения",
+    }
+
     def __init__(self, page: ft.Page):
         self.page = page
 
         self.configure_window()
 
-        self.api = SteamAPIManager(API_KEY)
-        self.db = DBManager()
-        self.db.connect()
+        # Заполняются в start_backend
+        self.api = None
+        self.db = None
+        self.importer = None
+        self.avatars = None
+        self.icons = None
+        self.analytics = None
+        self.backend_ready = threading.Event()
 
+        self.ui_lock = threading.Lock()
+        self.job_rows: Dict[int, ft.Row] = {}
+        self.jobs = JobRunner(on_event=self.on_job_event)
 
         self.initialize_ui()
-        self.load_profiles()
-        self.loading_indicator = self.create_loading_indicator()
-        self.page.overlay.append(self.loading_indicator)
-        self.processing = False  # Флаг блокировки
+        # Кнопки станут доступны, когда появится подключение к БД
+        self.top_panel.disabled = True
+        self.nickname_label.value = "Загрузка..."
+        self.page.update()
+        threading.Thread(target=self.start_backend, name="backend-init", daemon=True).start()
 
+    def start_backend(self):
+        """Import the API/DB layers and connect in the background so the window shows immediately"""
+        try:
+            from steam_api import SteamAPIManager
+            from db import DBManager
+            from importer import ProfileImporter
+            from avatar_cache import AvatarCache, ICON_CACHE_DIR, ICON_CACHE_SIZE, ICON_MAX_AGE_HOURS
+
+            self.api = SteamAPIManager(API_KEY)
+            self.db = DBManager()
+            self.importer = ProfileImporter(self.api, self.db)
+            self.avatars = AvatarCache(self.api)
+            self.icons = AvatarCache(self.api, ICON_CACHE_DIR, ICON_CACHE_SIZE, ICON_MAX_AGE_HOURS)
+        except Exception as e:
+            print(f"Error starting backend: {e}")
+            self.nickname_label.value = "Нет подключения к базе данных"
+            self.page.update()
+            return
 
-    def create_loading_indicator(self):
-        return ft.Container(
-            content=ft.Column(
-                [
-                    ft.ProgressRing(width=50, height=50, stroke_width=3),
-                    ft.Text("Processing...", size=16)
-                ],
-                alignment=ft.MainAxisAlignment.CENTER,
-                horizontal_alignment=ft.CrossAxisAlignment.CENTER
-            ),
-            alignment=ft.alignment.center,
-            bgcolor=ft.Colors.with_opacity(0.7, ft.Colors.BLACK),
-            border_radius=10,
-            padding=30,
-            visible=False
-        )
+        # Аналитика требует numpy; без него остаются только основные диаграммы
+        try:
+            from analytics import ProfileAnalytics
+            self.analytics = ProfileAnalytics(self.db)
+        except ImportError as e:
+            print(f"Analytics disabled: {e}")
 
-    def toggle_loading(self, visible: bool):
-        self.loading_indicator.visible = visible
-        self.processing = visible
-        # Блокируем/разблокируем кнопки
-        self.top_panel.disabled = visible
+        self.backend_ready.set()
+        self.top_panel.disabled = False
+        self.load_profiles()
+        self.resume_unfinished_imports()
         self.page.update()
+        self.refresh_leaderboards_in_background()
+        # Без sync_daemon разделы истории времени в игре иначе никогда не создавались бы
+        threading.Thread(target=self.db.maintain_playtime_partitions, name="playtime-partitions", daemon=True).start()
+
+    def refresh_leaderboards_in_background(self):
+        """Rebuild leaderboard ranks off the UI thread; a no-op if profile_stats has not changed"""
+        threading.Thread(target=self.db.refresh_leaderboards, name="leaderboards", daemon=True).start()
 
     def load_profiles(self):
         """Populate profile dropdown from database using steam_id"""
-        profiles = self.db.execute_query("SELECT steam_id, nickname FROM profiles")
+        profiles = self.db.execute_query("SELECT steam_id, nickname FROM profiles", cache=True)
         if profiles:
             self.profile_combo.options = [
                 ft.dropdown.Option(text=profile['nickname'], key=profile['steam_id'])
@@ -358,122 +129,305 @@ class SteamStatsApp:
 
         # Получаем актуальные данные
         stats_data = stats[0]
-        print("Debug Stats:", stats_data)  # Вывод данных для отладки
 
         # Обновляем интерфейс
         self.update_stats_table(stats_data)
         self.update_progress_chart(stats_data)
         self.update_rarity_chart(stats_data)
+        self.update_analytics(selected_steam_id, stats_data)
+        self.update_activity_chart(selected_steam_id)
         self.update_avatar(stats_data.get('avatar_url', ''))
         self.nickname_label.value = self.db.get_profile_nickname_by_steam_id(selected_steam_id) or "Unknown"
         self.page.update()
 
     def update_profile_data(self, e=None):
-        """Update the selected profile's data from Steam API using steam_id"""
-        try:
-            self.toggle_loading(True)  # Показываем индикатор загрузки
-            selected_steam_id = self.profile_combo.value
-            if not selected_steam_id:
-                print("No profile selected.")
-                return
-
-            # Fetch updated profile data from Steam API
-            profile_info = self.api.get_player_summary(selected_steam_id)
-            if not profile_info:
-                print("Failed to fetch updated profile data from Steam API.")
-                return
-
-            # Update profile data in the database
-            self.db.execute_update(
-                """
-                UPDATE profiles 
-                SET registration_date = %s, avatar_url = %s 
-                WHERE steam_id = %s
-                """,
-                (
-                    datetime.fromtimestamp(profile_info.get('timecreated', 0)),
-                    profile_info.get('avatar', ''),
-                    selected_steam_id
-                )
-            )
+        """Queue a background refresh of the selected profile using steam_id"""
+        selected_steam_id = self.profile_combo.value
+        if not selected_steam_id:
+            print("No profile selected.")
+            return
 
-            # Clear old game and achievement data
-            self.db.execute_update(
-                "DELETE FROM profile_games WHERE profile_id = %s",
-                (selected_steam_id,)
-            )
-            self.db.execute_update(
-                "DELETE FROM profile_achievements WHERE profile_id = %s",
-                (selected_steam_id,)
-            )
+        if not self.jobs.submit(selected_steam_id, "refresh", self.importer.refresh_profile):
+            print(f"Profile {selected_steam_id} is already being processed.")
 
-            # Reload games and achievements
-            self.load_games_and_achievements(selected_steam_id)
+    def resume_unfinished_imports(self):
+        """Queue imports that were interrupted last time; they continue from their checkpoints.
 
-            # Refresh the UI
-            self.update_display()
-            print(f"Profile data for {selected_steam_id} updated successfully.")
+        Imports cancelled from the jobs panel drop their checkpoints and are not resumed.
+        """
+        for steam_id in self.db.get_unfinished_imports():
+            self.jobs.submit(steam_id, "resume", self.importer.load_games_and_achievements)
+
+    def update_all_profiles(self, e=None):
+        """Queue a batched refresh of nickname, avatar and registration for every profile"""
+        if not self.jobs.submit("all", "summaries",
+                                lambda _, progress: self.importer.refresh_all_summaries(progress)):
+            print("Profile summaries are already being refreshed.")
+
+    def on_job_event(self, job: Job):
+        """Handle progress and status changes of background jobs"""
+        self.update_progress(job)
+        if job.status == Job.DONE:
+            self.refresh_leaderboards_in_background()
+            self.load_profiles()
+            if job.steam_id in ("all", str(self.profile_combo.value)):
+                self.update_display()
+            print(f"Profile data for {job.steam_id} updated successfully.")
+        elif job.status == Job.CANCELLED and job.kind in ("import", "resume"):
+            # Отменённый пользователем импорт не должен возобновляться при каждом запуске
+            self.db.clear_import_checkpoints(job.steam_id)
+
+    def update_progress(self, job: Job):
+        """Show a job's state and progress in the jobs panel"""
+        labels = {
+            Job.QUEUED: "в очереди",
+            Job.RUNNING: "выполняется",
+            Job.DONE: "готово",
+            Job.FAILED: "ошибка",
+            Job.CANCELLED: "отменено",
+        }
+        text = f"{job.kind} {job.steam_id}: {labels[job.status]}"
+        if job.total:
+            text += f" ({job.processed}/{job.total})"
+
+        with self.ui_lock:
+            row = self.job_rows.get(job.id)
+            if row is None:
+                row = ft.Row(
+                    [
+                        ft.ProgressRing(width=16, height=16, stroke_width=2),
+                        ft.Text(text),
+                        ft.IconButton(ft.Icons.CLOSE, tooltip="Отменить",
+                                      on_click=lambda e, job=job: self.dismiss_job(job)),
+                    ],
+                    spacing=10
+                )
+                self.job_rows[job.id] = row
+                self.jobs_panel.controls.append(row)
+
+            ring, label, _ = row.controls
+            ring.visible = not job.finished
+            label.value = text
+            # Успешные задачи убираются сразу, ошибки и отмены остаются до закрытия
+            if job.status == Job.DONE:
+                self.jobs_panel.controls.remove(self.job_rows.pop(job.id))
+        self.page.update()
 
-        except Exception as e:
-            print(f"Error updating profile data: {e}")
-        finally:
-            self.toggle_loading(False)  # Скрываем индикатор загрузки
+    def dismiss_job(self, job: Job):
+        """Cancel a pending job or remove a finished one from the panel"""
+        if not job.finished:
+            self.jobs.cancel(job.steam_id)
+            return
+        with self.ui_lock:
+            if row := self.job_rows.pop(job.id, None):
+                self.jobs_panel.controls.remove(row)
+        self.page.update()
 
     def show_games_list(self, e=None):
-        """Display a dialog with the list of games for the selected profile using steam_id"""
+        """Display a paged dialog with the games of the selected profile using steam_id"""
         selected_steam_id = self.profile_combo.value
         if not selected_steam_id:
             print("No profile selected.")
             return
 
-        try:
-            games = self.db.get_profile_games(selected_steam_id)
-            if not games:
-                print("No games found for this profile.")
-                return
-
-            # Создаем таблицу с проверкой значений
-            games_table = ft.DataTable(
-                columns=[
-                    ft.DataColumn(ft.Text("Игра")),
-                    ft.DataColumn(ft.Text("Достижений")),
-                    ft.DataColumn(ft.Text("Получено")),
-                    ft.DataColumn(ft.Text("Завершенность %")),
+        self.games_view = {
+            "steam_id": selected_steam_id,
+            "offset": 0,
+            "sort": "name",
+            "descending": False,
+            "name_filter": None,
+            "completion": None,
+        }
+        # Таблица содержит только текущую страницу; сортировка и фильтры выполняются в БД
+        self.games_table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text(title), numeric=key != "name", on_sort=self.sort_games_list)
+                for title, key in self.GAMES_COLUMNS
+            ],
+            sort_column_index=0,
+            sort_ascending=True,
+        )
+        self.games_search = ft.TextField(label="Поиск по названию", expand=True,
+                                         on_submit=self.filter_games_list)
+        self.games_completion = ft.Dropdown(
+            width=170,
+            value="all",
+            options=[
+                ft.dropdown.Option(key="all", text="Все"),
+                ft.dropdown.Option(key="completed", text="Завершенные"),
+                ft.dropdown.Option(key="in_progress", text="В процессе"),
+                ft.dropdown.Option(key="not_started", text="Не начатые"),
+            ],
+            on_change=self.filter_games_list,
+        )
+        self.games_page_label = ft.Text()
+        self.games_prev = ft.IconButton(ft.Icons.CHEVRON_LEFT, on_click=lambda _: self.change_games_page(-1))
+        self.games_next = ft.IconButton(ft.Icons.CHEVRON_RIGHT, on_click=lambda _: self.change_games_page(1))
+
+        if not self.load_games_page():
+            print("No games found for this profile.")
+            return
+
+        self.dialog = ft.AlertDialog(
+            title=ft.Text("Games List"),
+            content=ft.Column(
+                controls=[
+                    ft.Row([self.games_search, self.games_completion]),
+                    ft.Column(controls=[self.games_table], scroll=ft.ScrollMode.AUTO, expand=True),
+                    ft.Row([self.games_prev, self.games_page_label, self.games_next],
+                           alignment=ft.MainAxisAlignment.CENTER),
                 ],
-                rows=[
-                    ft.DataRow(
-                        cells=[
-                            ft.DataCell(ft.Text(game['name'])),
-                            ft.DataCell(ft.Text(str(game['total_achievements'] or 0))),
-                            ft.DataCell(ft.Text(str(game['completed_achievements'] or 0))),
-                            ft.DataCell(ft.Text(
-                                f"{game['completion_percent'] or 0:.1f}%"
-                                if game['completion_percent'] is not None
-                                else "0.0%"
-                            )),
-                        ]
-                    )
-                    for game in games
+                height=480,
+                width=600
+            ),
+            actions=[ft.ElevatedButton("Закрыть", on_click=self.close_dialog)],
+        )
+
+        self.page.overlay.append(self.dialog)
+        self.dialog.open = True
+        self.page.update()
+
+    def load_games_page(self) -> int:
+        """Fetch the current page of the games dialog; returns the number of matching games"""
+        view = self.games_view
+        try:
+            games, total = self.db.get_profile_games_page(
+                view["steam_id"],
+                offset=view["offset"],
+                limit=self.GAMES_PAGE_SIZE,
+                sort=view["sort"],
+                descending=view["descending"],
+                name_filter=view["name_filter"],
+                completion=view["completion"],
+            )
+        except Exception as e:
+            print(f"Error displaying games list: {e}")
+            return 0
+
+        self.games_table.rows = [
+            ft.DataRow(
+                cells=[
+                    ft.DataCell(ft.Text(game['name'])),
+                    ft.DataCell(ft.Text(str(game['total_achievements']))),
+                    ft.DataCell(ft.Text(str(game['completed_achievements']))),
+                    ft.DataCell(ft.Text(f"{float(game['completion_percent']):.1f}%")),
                 ]
             )
+            for game in games
+        ]
+        pages = max(1, -(-total // self.GAMES_PAGE_SIZE))
+        current = view["offset"] // self.GAMES_PAGE_SIZE + 1
+        self.games_page_label.value = f"Стр. {current} из {pages} ({total} игр)"
+        self.games_prev.disabled = view["offset"] == 0
+        self.games_next.disabled = view["offset"] + self.GAMES_PAGE_SIZE >= total
+        return total
+
+    def sort_games_list(self, e: ft.DataColumnSortEvent):
+        self.games_view["sort"] = self.GAMES_COLUMNS[e.column_index][1]
+        self.games_view["descending"] = not e.ascending
+        self.games_view["offset"] = 0
+        self.games_table.sort_column_index = e.column_index
+        self.games_table.sort_ascending = e.ascending
+        self.load_games_page()
+        self.page.update()
 
-            self.dialog = ft.AlertDialog(
-                title=ft.Text("Games List"),
-                content=ft.Column(
-                    controls=[games_table],
-                    scroll=ft.ScrollMode.AUTO,
-                    height=400,
-                    width=600
-                ),
-                actions=[ft.ElevatedButton("Закрыть", on_click=self.close_dialog)],
-            )
+    def filter_games_list(self, e=None):
+        self.games_view["name_filter"] = (self.games_search.value or "").strip() or None
+        completion = self.games_completion.value
+        self.games_view["completion"] = None if completion == "all" else completion
+        self.games_view["offset"] = 0
+        self.load_games_page()
+        self.page.update()
 
-            self.page.overlay.append(self.dialog)
-            self.dialog.open = True
-            self.page.update()
+    def change_games_page(self, step: int):
+        self.games_view["offset"] = max(0, self.games_view["offset"] + step * self.GAMES_PAGE_SIZE)
+        self.load_games_page()
+        self.page.update()
+
+    def show_leaderboard(self, e=None):
+        """Display rankings across all tracked profiles"""
+        # Места пересчитываются в фоне (refresh_leaderboards_in_background), здесь только чтение
+        self.leaderboard_view = ft.Dropdown(
+            width=250,
+            value="completed_games",
+            options=[ft.dropdown.Option(key=key, text=title) for key, title in self.LEADERBOARD_VIEWS.items()],
+            on_change=self.load_leaderboard,
+        )
+        self.leaderboard_rank = ft.Text(weight=ft.FontWeight.BOLD)
+        self.leaderboard_table = ft.DataTable(columns=[ft.DataColumn(ft.Text(""))])
+        self.load_leaderboard()
+
+        self.dialog = ft.AlertDialog(
+            title=ft.Text("Таблица лидеров"),
+            content=ft.Column(
+                controls=[
+                    ft.Row([self.leaderboard_view, self.leaderboard_rank]),
+                    ft.Column(controls=[self.leaderboard_table], scroll=ft.ScrollMode.AUTO, expand=True),
+                ],
+                height=480,
+                width=600
+            ),
+            actions=[ft.ElevatedButton("Закрыть", on_click=self.close_dialog)],
+        )
+
+        self.page.overlay.append(self.dialog)
+        self.dialog.open = True
+        self.page.update()
 
+    def load_leaderboard(self, e=None):
+        """Fill the leaderboard table for the selected ranking"""
+        view = self.leaderboard_view.value
+        selected_steam_id = self.profile_combo.value
+        try:
+            if view == "rarest":
+                rows = self.db.get_rarest_unlocks(self.LEADERBOARD_SIZE)
+                icons = self.load_icons([row['icon'] for row in rows])
+                columns = ["", "Достижение", "Игра", "Редкость %", "Профиль"]
+                cells = [
+                    [self.icon_control(icons.get(row['icon'])), row['display_name'] or row['achievement_name'],
+                     row['game_name'], f"{float(row['rarity']):.2f}", row['nickname']]
+                    for row in rows
+                ]
+                self.leaderboard_rank.value = ""
+            else:
+                rows = self.db.get_leaderboard(view, self.LEADERBOARD_SIZE)
+                columns = ["Место", "Профиль", self.LEADERBOARD_VIEWS[view]]
+                cells = [[str(row['position']), row['nickname'], f"{float(row['value']):g}"] for row in rows]
+                rank = self.db.get_profile_ranks(selected_steam_id).get(view) if selected_steam_id else None
+                self.leaderboard_rank.value = (
+                    f"Ваше место: {rank['position']} из {len(self.profile_combo.options)}" if rank else ""
+                )
         except Exception as e:
-            print(f"Error displaying games list: {e}")
+            print(f"Error loading leaderboard: {e}")
+            return
+
+        self.leaderboard_table.columns = [
+            ft.DataColumn(ft.Text(title), numeric=title in ("Место", "Редкость %")) for title in columns
+        ]
+        self.leaderboard_table.rows = [
+            ft.DataRow(
+                cells=[ft.DataCell(value if isinstance(value, ft.Control) else ft.Text(value)) for value in values],
+                # Выбранный профиль подсвечивается
+                selected=str(row['steam_id']) == str(selected_steam_id),
+            )
+            for row, values in zip(rows, cells)
+        ]
+        if e is not None:
+            self.page.update()
+
+    def load_icons(self, urls: List[Optional[str]]) -> Dict[str, str]:
+        """Base64 thumbnails for achievement icon URLs; missing ones are downloaded in parallel"""
+        unique = list({url for url in urls if url})
+        if not unique:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(8, len(unique))) as executor:
+            return {url: payload for url, payload in zip(unique, executor.map(self.icons.get, unique)) if payload}
+
+    @staticmethod
+    def icon_control(payload: Optional[str]) -> ft.Control:
+        if payload:
+            return ft.Image(src_base64=payload, width=32, height=32)
+        return ft.Container(width=32, height=32)
 
     def close_dialog(self, e=None):
         """Close the currently open dialog."""
@@ -509,7 +463,9 @@ class SteamStatsApp:
         control_buttons = [
             ft.ElevatedButton("Добавить", on_click=self.show_add_profile_dialog),
             ft.ElevatedButton("Обновить", on_click=self.update_profile_data),
-            ft.ElevatedButton("Список игр", on_click=self.show_games_list)
+            ft.ElevatedButton("Обновить все", on_click=self.update_all_profiles),
+            ft.ElevatedButton("Список игр", on_click=self.show_games_list),
+            ft.ElevatedButton("Лидеры", on_click=self.show_leaderboard)
         ]
 
         self.top_panel = ft.Row(
@@ -517,6 +473,9 @@ class SteamStatsApp:
             spacing=20,
         )
 
+        # Очередь фоновых импортов и обновлений
+        self.jobs_panel = ft.Column(spacing=5)
+
     def create_stats_display(self):
         """Create profile info and statistics display without visible column headers"""
         self.profile_icon = ft.Image(
@@ -566,6 +525,63 @@ class SteamStatsApp:
         )
         self.rarity_label = ft.Text("0%", size=20, weight="bold")
 
+        # Распределения из модуля аналитики
+        self.rarity_histogram = ft.BarChart(
+            bar_groups=[],
+            left_axis=ft.ChartAxis(labels_size=40),
+            bottom_axis=ft.ChartAxis(labels_size=30),
+            horizontal_grid_lines=ft.ChartGridLines(color=ft.Colors.GREY_300, width=1),
+            tooltip_bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_800),
+            height=220,
+            width=360
+        )
+        self.completion_histogram = ft.BarChart(
+            bar_groups=[],
+            left_axis=ft.ChartAxis(labels_size=40),
+            bottom_axis=ft.ChartAxis(labels_size=30),
+            horizontal_grid_lines=ft.ChartGridLines(color=ft.Colors.GREY_300, width=1),
+            tooltip_bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_800),
+            height=220,
+            width=360
+        )
+        # Часы в игре по неделям из истории синхронизаций
+        self.activity_chart = ft.BarChart(
+            bar_groups=[],
+            left_axis=ft.ChartAxis(labels_size=40),
+            bottom_axis=ft.ChartAxis(labels_size=30),
+            horizontal_grid_lines=ft.ChartGridLines(color=ft.Colors.GREY_300, width=1),
+            tooltip_bgcolor=ft.Colors.with_opacity(0.8, ft.Colors.GREY_800),
+            height=220,
+            width=600
+        )
+        self.activity_section = ft.Column(
+            [ft.Text(f"Часы в играх за {self.ACTIVITY_WEEKS} недель"), self.activity_chart],
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            visible=False
+        )
+
+        self.score_label = ft.Text("", size=16, weight="bold")
+        self.eta_label = ft.Text("", size=14)
+        self.analytics_section = ft.Column(
+            [
+                ft.Row([self.score_label], alignment=ft.MainAxisAlignment.CENTER),
+                ft.Row(
+                    [
+                        ft.Column([ft.Text("Редкость достижений (получено / всего)"), self.rarity_histogram],
+                                  horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                        ft.Column([ft.Text("Игры по прохождению"), self.completion_histogram],
+                                  horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                    ],
+                    spacing=40,
+                    alignment=ft.MainAxisAlignment.CENTER
+                ),
+                self.eta_label,
+            ],
+            spacing=10,
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            visible=False
+        )
+
     def assemble_layout(self):
         """Arrange UI components with legend and center alignment"""
         # Создаем контейнеры для диаграмм с легендой
@@ -615,6 +631,7 @@ class SteamStatsApp:
         main_column = ft.Column(
             controls=[
                 self.top_panel,
+                self.jobs_panel,
                 ft.Divider(height=10),
                 ft.Row(
                     [self.profile_icon, self.stats_table],
@@ -622,7 +639,10 @@ class SteamStatsApp:
                     alignment=ft.MainAxisAlignment.CENTER  # Центрируем профиль и таблицу
                 ),
                 ft.Divider(height=10),
-                charts_row
+                charts_row,
+                ft.Divider(height=10),
+                self.analytics_section,
+                self.activity_section
             ],
             expand=True,
             scroll=ft.ScrollMode.AUTO,
@@ -656,22 +676,18 @@ class SteamStatsApp:
 
     def update_avatar(self, url: str):
         """Update profile avatar image"""
-        if image_data := self.api.get_avatar_image(url):
-            self.profile_icon.src_base64 = base64.b64encode(image_data).decode()
+        if payload := self.avatars.get(url):
+            self.profile_icon.src_base64 = payload
             self.page.update()
 
     # Profile management methods
     def show_add_profile_dialog(self, e):
         """Display profile addition dialog"""
-        if self.processing:
-            return  # Игнорируем нажатие, если уже идет обработка
-
         url_field = ft.TextField(label="Steam Profile URL", expand=True)
 
         def save_profile(e):
             if url := url_field.value:
                 self.process_new_profile(url)
-                self.load_profiles()
                 self.dialog.open = False
                 self.page.update()
 
@@ -686,29 +702,14 @@ class SteamStatsApp:
         self.page.update()
 
     def process_new_profile(self, profile_url: str):
-        """Handle new profile addition logic"""
-        try:
-            self.toggle_loading(True)  # Показываем индикатор загрузки
-            steam_id = self.extract_steam_id(profile_url)
-            if not steam_id:
-                return
-
-            if profile_data := self.api.get_player_summary(steam_id):
-                success = self.db.insert_profile(
-                    nickname=profile_data.get('personaname', 'Unknown'),
-                    steam_id=steam_id,
-                    registration_date=datetime.fromtimestamp(profile_data.get('timecreated', 0)),
-                    avatar_url=profile_data.get('avatar', '')
-                )
+        """Queue a background import of a new profile"""
+        steam_id = self.extract_steam_id(profile_url)
+        if not steam_id:
+            print(f"Could not extract SteamID from {profile_url}")
+            return
 
-                if success:
-                    self.load_games_and_achievements(steam_id)
-                    self.load_profiles()  # Обновляем список профилей после добавления
-                    self.page.update()
-        except Exception as e:
-            print(f"Error processing new profile: {e}")
-        finally:
-            self.toggle_loading(False)  # Скрываем индикатор загрузки
+        if not self.jobs.submit(steam_id, "import", self.importer.add_profile):
+            print(f"Profile {steam_id} is already being processed.")
 
     def extract_steam_id(self, url: str) -> Optional[str]:
         """Extract SteamID from profile URL"""
@@ -722,151 +723,6 @@ class SteamStatsApp:
                 return processor(url.split(pattern)[1])
         return None
 
-    def load_games_and_achievements(self, steam_id: str):
-        try:
-            steam_id_int = int(steam_id)
-            games = self.api.get_owned_games(steam_id)
-            total_games = len(games)
-
-            schema_cache = {}
-            game_batch = []
-            profile_game_batch = []
-            achievement_batch = []
-            profile_achievement_batch = []
-
-            for i, game in enumerate(games):
-                game_id = game['appid']
-
-                # Добавляем игру в профиль
-                profile_game_batch.append((
-                    steam_id_int,
-                    game_id,
-                    game.get('playtime_forever', 0)
-                ))
-
-                # Добавляем информацию об игре
-                game_batch.append((game_id, game.get('name', 'Unknown')))
-
-                # Получаем достижения только для игр со статистикой
-                if game.get('has_community_visible_stats', 0) == 1:
-                    try:
-                        # Получаем данные об игровых достижениях
-                        player_achievements = self.api.get_player_achievements(steam_id, game_id)
-
-                        # Получаем глобальную статистику достижений
-                        if game_id not in schema_cache:
-                            schema_cache[game_id] = self.api.get_achievement_schema(game_id)
-
-                        # Обрабатываем каждое достижение
-                        for ach in player_achievements:
-                            apiname = ach.get('apiname')
-                            if not apiname:
-                                continue
-
-                            # Получаем редкость из кэша
-                            rarity = schema_cache[game_id].get(apiname, 0.0)
-
-                            achievement_batch.append((
-                                game_id,
-                                apiname,
-                                rarity  # Добавляем показатель редкости
-                            ))
-
-                            profile_achievement_batch.append((
-                                apiname,
-                                int(ach.get('achieved', 0))
-                            ))
-
-                    except Exception as e:
-                        print(f"Error processing achievements for app {game_id}: {e}")
-
-                # Обновление прогресса
-                if i % 10 == 0 or i == total_games - 1:
-                    self.update_progress(i + 1, total_games)
-
-            # Пакетная вставка данных
-            self.bulk_insert_games(game_batch)
-            self.bulk_insert_profile_games(profile_game_batch)
-            self.bulk_insert_achievements(achievement_batch)
-            self.bulk_insert_profile_achievements(profile_achievement_batch, steam_id_int)
-
-            self.show_completion_message()
-
-        except Exception as e:
-            print(f"Error in load_games_and_achievements: {e}")
-            raise
-        finally:
-            self.toggle_loading(False)
-
-    def update_progress(self, processed: int, total: int):
-        self.loading_indicator.content.controls[1].value = f"Processed {processed}/{total} games"
-        self.page.update()
-
-    def bulk_insert_games(self, batch):
-        if batch:
-            self.db.execute_update(
-                """INSERT INTO games (app_id, name)
-                   VALUES (%s, %s)
-                   ON DUPLICATE KEY UPDATE name = VALUES(name)""",
-                batch,
-                many=True
-            )
-
-    def bulk_insert_profile_games(self, batch):
-        if batch:
-            self.db.execute_update(
-                """INSERT INTO profile_games (profile_id, game_id, playtime)
-                   VALUES (%s, %s, %s)
-                   ON DUPLICATE KEY UPDATE playtime = VALUES(playtime)""",
-                batch,
-                many=True
-            )
-
-    def bulk_insert_achievements(self, batch):
-        if batch:
-            self.db.execute_update(
-                """INSERT INTO achievements (game_id, achievement_name, rarity)
-                   VALUES (%s, %s, %s)
-                   ON DUPLICATE KEY UPDATE 
-                       achievement_name = VALUES(achievement_name),
-                       rarity = VALUES(rarity)""",
-                batch,
-                many=True
-            )
-
-    def bulk_insert_profile_achievements(self, batch, steam_id):
-        if batch:
-            achievement_ids = self.get_achievement_ids([a[0] for a in batch])
-            final_batch = [
-                (steam_id, achievement_ids[apiname], completeness)
-                for apiname, completeness in batch
-                if apiname in achievement_ids
-            ]
-            if final_batch:
-                self.db.execute_update(
-                    """INSERT INTO profile_achievements (profile_id, achievement_id, completeness)
-                       VALUES (%s, %s, %s)
-                       ON DUPLICATE KEY UPDATE completeness = VALUES(completeness)""",
-                    final_batch,
-                    many=True
-                )
-
-    def get_achievement_ids(self, apinames):
-        achievement_ids = {}
-        for i in range(0, len(apinames), 100):
-            batch = apinames[i:i + 100]
-            placeholders = ",".join(["%s"] * len(batch))
-            res = self.db.execute_query(
-                f"SELECT id, achievement_name FROM achievements WHERE achievement_name IN ({placeholders})",
-                batch
-            )
-            achievement_ids.update({row['achievement_name']: row['id'] for row in res})
-        return achievement_ids
-
-    def show_completion_message(self):
-        self.loading_indicator.content.controls[1].value = "Processing completed"
-        self.page.update()
-
     def update_progress_chart(self, stats: Dict):
         """Update progress chart with real data and external label"""
         completed = stats.get('completed_games', 0)
@@ -895,8 +751,71 @@ class SteamStatsApp:
         ]
         self.rarity_chart.update()
 
+    def update_analytics(self, steam_id: str, stats: Dict):
+        """Update score, histograms and completion estimates from the analytics module"""
+        result = self.analytics.get(steam_id, stats.get('stats_updated_at')) if self.analytics else None
+        self.analytics_section.visible = bool(result and result['achievements'])
+        if not self.analytics_section.visible:
+            return
+
+        self.score_label.value = (
+            f"Очки редкости: {result['score']:,} ({result['score_percent']:.1f}% от максимума)"
+        )
+        self.set_bar_chart(self.rarity_histogram, result['rarity_labels'],
+                           result['rarity_unlocked'], result['rarity_all'])
+        self.set_bar_chart(self.completion_histogram, result['completion_labels'],
+                           result['completion_counts'])
+
+        if result['nearest_completions']:
+            nearest = ", ".join(
+                f"{game['name']} — ~{game['hours']:.1f} ч" for game in result['nearest_completions']
+            )
+            self.eta_label.value = (
+                f"До 100% в начатых играх: ~{result['hours_to_complete']:.0f} ч. Ближе всего: {nearest}"
+            )
+        else:
+            self.eta_label.value = ""
+
+    def update_activity_chart(self, steam_id: str):
+        """Show weekly playtime for the last ACTIVITY_WEEKS weeks, including weeks without play"""
+        today = datetime.now().date()
+        first_week = today - timedelta(days=today.weekday(), weeks=self.ACTIVITY_WEEKS - 1)
+        try:
+            rows = self.db.get_playtime_history(steam_id, "week", since=first_week)
+        except Exception as e:
+            print(f"Error loading playtime history: {e}")
+            rows = []
+        self.activity_section.visible = bool(rows)
+        if not rows:
+            return
+
+        hours = {row['bucket_start']: round(float(row['hours']), 1) for row in rows}
+        weeks = [first_week + timedelta(weeks=i) for i in range(self.ACTIVITY_WEEKS)]
+        self.set_bar_chart(self.activity_chart, [week.strftime("%d.%m") for week in weeks],
+                           [hours.get(week, 0) for week in weeks])
+
+    @staticmethod
+    def set_bar_chart(chart: ft.BarChart, labels: List[str], values: List[int], totals: Optional[List[int]] = None):
+        """Fill a bar chart; with totals each bar shows values stacked over the rest of the total"""
+        groups = []
+        for i, (label, value) in enumerate(zip(labels, values)):
+            top = totals[i] if totals else value
+            stack = [ft.BarChartRodStackItem(0, value, ft.Colors.AMBER)]
+            if top > value:
+                stack.append(ft.BarChartRodStackItem(value, top, ft.Colors.GREY_300))
+            groups.append(ft.BarChartGroup(x=i, bar_rods=[
+                ft.BarChartRod(from_y=0, to_y=top, width=30, border_radius=0, rod_stack_items=stack,
+                               tooltip=f"{label}: {value}" + (f" / {top}" if totals else ""))
+            ]))
+        chart.bar_groups = groups
+        chart.bottom_axis.labels = [
+            ft.ChartAxisLabel(value=i, label=ft.Text(label, size=11)) for i, label in enumerate(labels)
+        ]
+        chart.max_y = max(totals or values or [0]) * 1.1 or 1
+
 def main(page: ft.Page):
     SteamStatsApp(page)
 
 
-ft.app(target=main)
\ No newline at end of file
+if __name__ == "__main__":
+    ft.app(target=main)
\ No newline at end of file